@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 import nonebot_plugin_localstore as store
 from nonebot import get_plugin_config
@@ -36,6 +36,19 @@ class Config(BaseModel):
     mahjong_scoreboard_send_forward_message: bool = True
     mahjong_scoreboard_send_image: bool = False
     mahjong_scoreboard_enable_permission_check: bool = True
+    mahjong_scoreboard_leaderboard_cache_size: int = 64
+    mahjong_scoreboard_nickname_cache_size: int = 4096
+    mahjong_scoreboard_nickname_cache_ttl: int = 3600
+    mahjong_scoreboard_render_concurrency: int = 8
+    mahjong_scoreboard_render_cache_size: int = 16 * 1024 * 1024
+    mahjong_scoreboard_render_cache_disk_size: int = 0
+    mahjong_scoreboard_group_admin_cache_ttl: int = 300
+    mahjong_scoreboard_sqlite_journal_mode: Optional[str] = "wal"
+    mahjong_scoreboard_sqlite_synchronous: Optional[str] = "normal"
+    mahjong_scoreboard_sqlite_busy_timeout: Optional[int] = 5000
+    mahjong_scoreboard_sqlite_cache_size: Optional[int] = -16000
+    mahjong_scoreboard_sqlite_mmap_size: Optional[int] = 67108864
+    mahjong_scoreboard_migration_batch_size: Optional[int] = None
 
     @compatible_model_pre_validator
     def default_sql_conn_url(cls, values: dict[str, Any]):
@@ -2,6 +2,7 @@ from . import game_export
 from . import game_query
 from . import game_record
 from . import game_statistics
+from . import group_notice
 from . import season_manage
 from . import season_query
 from . import season_user_point_export
@@ -1,5 +1,4 @@
 from datetime import datetime
-from io import StringIO
 
 import tzlocal
 from nonebot import Bot
@@ -10,9 +9,9 @@ from .mapper.game_csv_mapper import write_games_csv
 from .mg import matcher_group
 from .utils.dep import GroupDep, SeasonFromUnaryArgOrRunningSeason
 from .utils.general_handlers import require_store_command_args, require_platform_group_id
-from .utils.send_csv import send_csv
+from .utils.send_csv import send_csv, spooled_csv_file
 from ..model import Group, Season, SeasonState
-from ..service.game_service import get_games
+from ..service.game_service import iter_games
 from ..utils.date import encode_date
 from ..utils.nonebot import default_cmd_start
 
@@ -28,11 +27,6 @@ require_platform_group_id(export_season_games_matcher)
 @handle_error()
 async def export_season_games(group: Group = GroupDep(),
                               season: Season = SeasonFromUnaryArgOrRunningSeason()):
-    games = await get_games(group_id=group.id, season_id=season.id)
-
-    if games.total == 0:
-        raise QueryError("本赛季还没有创建过对局")
-
     filename = f"赛季对局 {season.name}"
     if season.state == SeasonState.finished:
         filename += "（已结束）"
@@ -41,10 +35,13 @@ async def export_season_games(group: Group = GroupDep(),
         filename += f"（截至{encode_date(now)}）"
     filename += ".csv"
 
-    with StringIO() as sio:
-        await write_games_csv(sio, games.data)
-        sio.seek(0)
-        await send_csv(sio, filename)
+    with spooled_csv_file() as f:
+        cnt = await write_games_csv(f, iter_games(group_id=group.id, season_id=season.id))
+        if cnt == 0:
+            raise QueryError("本赛季还没有创建过对局")
+
+        f.seek(0)
+        await send_csv(f, filename)
 
 
 # ========== 导出所有对局 ==========
@@ -58,15 +55,13 @@ require_platform_group_id(export_season_games_matcher)
 @export_group_games_matcher.handle()
 @handle_error()
 async def export_group_games(group: Group = GroupDep()):
-    games = await get_games(group.id)
-
-    if games.total == 0:
-        raise QueryError("本群还没有创建过对局")
-
     now = datetime.now(tzlocal.get_localzone())
     filename = f"所有对局（截至{encode_date(now)}）.csv"
 
-    with StringIO() as sio:
-        await write_games_csv(sio, games.data)
-        sio.seek(0)
-        await send_csv(sio, filename)
+    with spooled_csv_file() as f:
+        cnt = await write_games_csv(f, iter_games(group.id))
+        if cnt == 0:
+            raise QueryError("本群还没有创建过对局")
+
+        f.seek(0)
+        await send_csv(f, filename)
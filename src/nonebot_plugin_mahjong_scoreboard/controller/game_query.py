@@ -4,7 +4,7 @@ from nonebot import Bot
 from ssttkkl_nonebot_utils.errors.errors import BadRequestError, QueryError
 from ssttkkl_nonebot_utils.interceptor.handle_error import handle_error
 
-from .mapper.game_mapper import map_game, map_game_lite
+from .mapper.game_mapper import map_game, map_game_lite, prefetch_game_nicknames
 from .mapper.pagination_mapper import map_pagination
 from .mg import matcher_group
 from .utils.dep import GroupDep, UnaryArg, UserDep
@@ -13,7 +13,7 @@ from .utils.parse import parse_int_or_error
 from .utils.send_msg import send_msg
 from ..model import Group, User
 from ..service import game_service
-from ..service.game_service import get_games
+from ..service.game_service import get_games, get_games_by_cursor
 from ..utils.nickname import get_user_nickname
 from ..utils.nonebot import default_cmd_start
 
@@ -57,9 +57,10 @@ async def query_user_recent_games(bot: Bot,
     end_time = datetime.combine(date.today() + timedelta(days=1), time())
     start_time = datetime.combine(end_time - timedelta(days=7), time())
 
-    games = await get_games(group.id, user.id, reverse_order=True, time_span=(start_time, end_time))
+    games = await get_games_by_cursor(group.id, user.id, reverse_order=True, time_span=(start_time, end_time))
+    await prefetch_game_nicknames(games.data)
     msgs = await map_pagination(games.data, map_game_lite)
-    if games.total != 0:
+    if len(games.data) != 0:
         msgs.insert(0, f"以下是[{await get_user_nickname(bot, user.platform_user_id, group.platform_group_id)}]"
                        f"最近七天的对局：")
 
@@ -82,9 +83,10 @@ async def query_group_recent_games(group=GroupDep()):
     end_time = datetime.combine(date.today() + timedelta(days=1), time())
     start_time = datetime.combine(end_time - timedelta(days=7), time())
 
-    games = await get_games(group.id, reverse_order=True, time_span=(start_time, end_time))
+    games = await get_games_by_cursor(group.id, reverse_order=True, time_span=(start_time, end_time))
+    await prefetch_game_nicknames(games.data)
     msgs = await map_pagination(games.data, map_game_lite)
-    if games.total != 0:
+    if len(games.data) != 0:
         msgs.insert(0, f"以下是本群最近七天的对局：")
 
         await send_msg(*msgs)
@@ -107,6 +109,7 @@ async def query_user_uncompleted_games(bot: Bot,
                                        group=GroupDep(),
                                        user: User = UserDep()):
     games = await get_games(group.id, user.id, uncompleted_only=True, reverse_order=True)
+    await prefetch_game_nicknames(games.data)
     msgs = await map_pagination(games.data, map_game_lite)
     if games.total != 0:
         msgs.insert(0, f"以下是[{await get_user_nickname(bot, user.platform_user_id, group.platform_group_id)}]"
@@ -129,6 +132,7 @@ require_platform_group_id(query_group_uncompleted_games_matcher)
 @handle_error()
 async def query_group_uncompleted_games(group=GroupDep()):
     games = await get_games(group.id, uncompleted_only=True, reverse_order=True)
+    await prefetch_game_nicknames(games.data)
     msgs = await map_pagination(games.data, map_game_lite)
     if games.total != 0:
         msgs.insert(0, f"以下是本群的未完成对局：")
@@ -14,7 +14,7 @@ from .utils.general_handlers import require_store_command_args, require_platform
 from .utils.send_msg import send_msg
 from ..model import GameStatistics, Group, Season, User
 from ..model.identity import get_platform_group_id
-from ..service.game_service import get_game_statistics, get_games, get_season_game_statistics
+from ..service.game_service import get_game_statistics, get_games_by_cursor, get_season_game_statistics
 from ..utils.nickname import get_user_nickname
 from ..utils.nonebot import default_cmd_start
 
@@ -33,9 +33,9 @@ async def query_season_user_trend(bot: Bot, group: Group = GroupDep(),
                                   session: Session = SessionDep(),
                                   user: User = UserDep(),
                                   season: Season = RunningSeasonDep()):
-    games = await get_games(group.id, user.id, season.id, limit=10, reverse_order=True, completed_only=True)
+    games = await get_games_by_cursor(group.id, user.id, season.id, limit=10, reverse_order=True, completed_only=True)
 
-    if games.total != 0:
+    if len(games.data) != 0:
         with StringIO() as sio:
             sio.write(
                 f"用户[{await get_user_nickname(bot, user.platform_user_id, get_platform_group_id(session))}]"
@@ -0,0 +1,25 @@
+from nonebot.internal.adapter import Event
+from nonebot_plugin_session import Session
+from ssttkkl_nonebot_utils.interceptor.handle_error import handle_error
+
+from .mg import matcher_group
+from .utils.dep import SessionDep
+from ..model.identity import get_platform_user_id
+from ..service.group_service import invalidate_group_admin
+
+# 群管理员变动（OneBot V11）、频道成员身份组变动（QQ Guild）
+_ROLE_CHANGE_EVENT_NAMES = ("notice.group_admin.set", "notice.group_admin.unset", "GUILD_MEMBER_UPDATE")
+
+
+def _is_role_change_notice(event: Event) -> bool:
+    return event.get_event_name() in _ROLE_CHANGE_EVENT_NAMES
+
+
+# ========== 成员身份变动 ==========
+role_change_notice_matcher = matcher_group.on_notice(rule=_is_role_change_notice, priority=1, block=False)
+
+
+@role_change_notice_matcher.handle()
+@handle_error()
+async def handle_role_change_notice(session: Session = SessionDep()):
+    await invalidate_group_admin(get_platform_user_id(session))
@@ -1,17 +1,79 @@
 import csv
-from typing import TextIO, Iterable
+from typing import TextIO, AsyncIterable, AsyncIterator, List
 
+from nonebot import Bot
 from nonebot.internal.matcher import current_bot
 
 from nonebot_plugin_mahjong_scoreboard.controller.mapper import game_state_mapping, \
     player_and_wind_mapping, map_datetime, map_point, wind_mapping
-from nonebot_plugin_mahjong_scoreboard.controller.mapper.game_mapper import map_game_progress
+from nonebot_plugin_mahjong_scoreboard.controller.mapper.game_mapper import map_game_progress, \
+    prefetch_game_nicknames
 from nonebot_plugin_mahjong_scoreboard.model import Game, GameState
+from nonebot_plugin_mahjong_scoreboard.utils.concurrent import map_concurrently
 from nonebot_plugin_mahjong_scoreboard.utils.nickname import get_user_nickname
 
 
-async def write_games_csv(f: TextIO, games: Iterable[Game]):
+# 每读取该数量的对局后批量预取一次昵称，并发映射为CSV行后写入
+CSV_CHUNK_SIZE = 200
+
+
+async def _chunked(games: AsyncIterable[Game], chunk_size: int) -> AsyncIterator[List[Game]]:
+    chunk = []
+    async for g in games:
+        chunk.append(g)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+async def _map_game_row(bot: Bot, g: Game) -> list:
+    row = [
+        g.code, player_and_wind_mapping[g.player_and_wind],
+        game_state_mapping[g.state],
+    ]
+
+    if g.state == GameState.completed:
+        row.append(map_datetime(g.complete_time))
+    else:
+        row.append("")
+
+    if g.season is not None:
+        row.append(g.season.name)
+    else:
+        row.append("")
+
+    if g.promoter is not None:
+        row.append(
+            f"{await get_user_nickname(bot, g.promoter.platform_user_id, g.group.platform_group_id)}"
+            f" ({g.promoter.platform_user_id.real_id})")
+    else:
+        row.append("")
+
+    for r in sorted(g.records, key=lambda x: x.raw_point, reverse=True):
+        row.extend([f"{await get_user_nickname(bot, r.user.platform_user_id, g.group.platform_group_id)}"
+                    f" ({r.user.platform_user_id.real_id})",
+                    r.score,
+                    map_point(r.raw_point, r.point_scale) if g.state == GameState.completed else '',
+                    wind_mapping[r.wind] if r.wind is not None else ''])
+
+    if g.progress is not None:
+        row.append(map_game_progress(g.progress))
+    else:
+        row.append("")
+
+    row.append(g.comment)
+    return row
+
+
+async def write_games_csv(f: TextIO, games: AsyncIterable[Game]) -> int:
+    """
+    将对局逐行写为CSV
+    :return: 写入的对局数
+    """
     bot = current_bot.get()
+    cnt = 0
 
     writer = csv.writer(f)
     writer.writerow(['对局编号', '对局类型', '状态', '完成时间',
@@ -21,41 +83,9 @@ async def write_games_csv(f: TextIO, games: Iterable[Game]):
                      '三位', '三位分数', '三位PT收支', '三位座次',
                      '四位', '四位分数', '四位PT收支', '四位座次',
                      '进度', '备注'])
-    for g in games:
-        row = [
-            g.code, player_and_wind_mapping[g.player_and_wind],
-            game_state_mapping[g.state],
-        ]
-
-        if g.state == GameState.completed:
-            row.append(map_datetime(g.complete_time))
-        else:
-            row.append("")
-
-        if g.season is not None:
-            row.append(g.season.name)
-        else:
-            row.append("")
-
-        if g.promoter is not None:
-            row.append(
-                f"{await get_user_nickname(bot, g.promoter.platform_user_id, g.group.platform_group_id)}"
-                f" ({g.promoter.platform_user_id.real_id})")
-        else:
-            row.append("")
-
-        for r in sorted(g.records, key=lambda x: x.raw_point, reverse=True):
-            row.extend([f"{await get_user_nickname(bot, r.user.platform_user_id, g.group.platform_group_id)}"
-                        f" ({r.user.platform_user_id.real_id})",
-                        r.score,
-                        map_point(r.raw_point, r.point_scale) if g.state == GameState.completed else '',
-                        wind_mapping[r.wind] if r.wind is not None else ''])
-
-        if g.progress is not None:
-            row.append(map_game_progress(g.progress))
-        else:
-            row.append("")
-
-        row.append(g.comment)
-
-        writer.writerow(row)
+    async for chunk in _chunked(games, CSV_CHUNK_SIZE):
+        await prefetch_game_nicknames(chunk)
+        writer.writerows(await map_concurrently(lambda g: _map_game_row(bot, g), chunk))
+        cnt += len(chunk)
+
+    return cnt
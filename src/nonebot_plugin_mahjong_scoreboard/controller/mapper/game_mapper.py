@@ -1,10 +1,11 @@
 from io import StringIO
+from typing import Iterable, Dict, List, Optional
 
 from nonebot.internal.matcher import current_bot
 
 from . import player_and_wind_mapping, game_state_mapping, digit_mapping, wind_mapping, map_datetime, map_point
-from ...model import Game, GameProgress, GameState
-from ...utils.nickname import get_user_nickname
+from ...model import Game, GameProgress, GameState, PlatformId
+from ...utils.nickname import get_user_nickname, prefetch_nicknames
 from ...utils.rank import ranked
 
 
@@ -23,6 +24,23 @@ def map_game_progress(progress: GameProgress) -> str:
         return io.getvalue()
 
 
+async def prefetch_game_nicknames(games: Iterable[Game]):
+    """
+    预取对局中所有用户的昵称
+    """
+    bot = current_bot.get()
+
+    platform_user_ids: Dict[Optional[PlatformId], List[PlatformId]] = {}
+    for game in games:
+        li = platform_user_ids.setdefault(game.group.platform_group_id, [])
+        if game.promoter is not None:
+            li.append(game.promoter.platform_user_id)
+        li.extend(r.user.platform_user_id for r in game.records)
+
+    for platform_group_id, li in platform_user_ids.items():
+        await prefetch_nicknames(bot, li, platform_group_id)
+
+
 async def map_game(game: Game, *, detailed: bool = False) -> str:
     bot = current_bot.get()
     with StringIO() as io:
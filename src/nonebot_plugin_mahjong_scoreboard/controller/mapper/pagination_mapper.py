@@ -1,6 +1,7 @@
-from inspect import isawaitable
 from io import StringIO
-from typing import List, TypeVar, Callable, Awaitable, Union
+from typing import List, TypeVar, Callable, Awaitable, Union, Optional
+
+from ...utils.concurrent import map_concurrently
 
 T = TypeVar("T")
 
@@ -8,17 +9,15 @@ T = TypeVar("T")
 async def map_pagination(data: List[T],
                          data_mapper: Union[Callable[[T], Awaitable[str]], Callable[[T], str]],
                          page_size: int = 10,
-                         spliter: str = "\n") -> List[str]:
+                         spliter: str = "\n",
+                         concurrency: Optional[int] = None) -> List[str]:
     msgs = []
 
     pending = 0
     pending_msg_io = StringIO()
 
-    for x in data:
-        line = data_mapper(x)
-        if isawaitable(line):
-            line = await line
-
+    # 并发映射各项，输出顺序与data一致
+    for line in await map_concurrently(data_mapper, data, concurrency):
         pending_msg_io.write(line)
         pending_msg_io.write(spliter)
         pending += 1
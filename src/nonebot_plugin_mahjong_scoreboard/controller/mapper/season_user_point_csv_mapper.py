@@ -1,11 +1,12 @@
 import csv
-from typing import TextIO, Iterable, List
+from typing import TextIO, AsyncIterable, List
 
 from nonebot.internal.matcher import current_bot
 
 from nonebot_plugin_mahjong_scoreboard.controller.mapper import map_datetime, map_point
-from nonebot_plugin_mahjong_scoreboard.model import Season, SeasonUserPointChangeLog, SeasonUserPointChangeType
-from nonebot_plugin_mahjong_scoreboard.utils.nickname import get_user_nickname
+from nonebot_plugin_mahjong_scoreboard.model import Season, SeasonUserPointChangeLogRow, SeasonUserPointChangeType
+from nonebot_plugin_mahjong_scoreboard.utils.concurrent import map_concurrently
+from nonebot_plugin_mahjong_scoreboard.utils.nickname import get_user_nickname, prefetch_nicknames
 
 
 def _ensure_size(li: list, new_size: int, default):
@@ -13,8 +14,12 @@ def _ensure_size(li: list, new_size: int, default):
         li.append(default)
 
 
-async def write_season_user_point_change_logs_csv(f: TextIO, logs: Iterable[SeasonUserPointChangeLog],
-                                                  season: Season):
+async def write_season_user_point_change_logs_csv(f: TextIO, logs: AsyncIterable[SeasonUserPointChangeLogRow],
+                                                  season: Season) -> int:
+    """
+    将按时间顺序排列的PT变动记录写为榜单CSV
+    :return: 参与赛季的用户数
+    """
     bot = current_bot.get()
 
     header = ['', '合计PT']
@@ -24,31 +29,43 @@ async def write_season_user_point_change_logs_csv(f: TextIO, logs: Iterable[Seas
     game_idx = {}
 
     user_point = {}
+    platform_user_ids = {}
     scale = season.config.point_precision
 
     # 初步绘制表格
-    for log in sorted(logs, key=lambda l: l.create_time):
-        if log.user.id not in user_idx:
-            table.append([f"{await get_user_nickname(bot, log.user.platform_user_id, season.group.platform_group_id)}"
-                          f" ({log.user.platform_user_id.real_id})", ""])
-            user_idx[log.user.id] = len(table) - 1
+    async for log in logs:
+        if log.user_id not in user_idx:
+            table.append(["", ""])
+            user_idx[log.user_id] = len(table) - 1
+            platform_user_ids[log.user_id] = log.platform_user_id
 
         if log.change_type == SeasonUserPointChangeType.game:
-            if log.related_game.id not in game_idx:
-                header.append(str(log.related_game.code))
-                game_idx[log.related_game.id] = len(header) - 1
+            if log.related_game_id not in game_idx:
+                header.append(str(log.related_game_code))
+                game_idx[log.related_game_id] = len(header) - 1
 
-            _ensure_size(table[user_idx[log.user.id]], game_idx[log.related_game.id] + 1, '')
-            table[user_idx[log.user.id]][game_idx[log.related_game.id]] = map_point(log.change_point, scale)
+            _ensure_size(table[user_idx[log.user_id]], game_idx[log.related_game_id] + 1, '')
+            table[user_idx[log.user_id]][game_idx[log.related_game_id]] = map_point(log.change_point, scale)
 
-            user_point[log.user.id] = user_point.get(log.user.id, 0) + log.change_point
+            user_point[log.user_id] = user_point.get(log.user_id, 0) + log.change_point
         elif log.change_type == SeasonUserPointChangeType.manually:
             header.append(f"手动设置\n{map_datetime(log.create_time)}")
 
-            _ensure_size(table[user_idx[log.user.id]], len(header), '')
-            table[user_idx[log.user.id]][-1] = map_point(log.change_point, scale)
+            _ensure_size(table[user_idx[log.user_id]], len(header), '')
+            table[user_idx[log.user_id]][-1] = map_point(log.change_point, scale)
 
-            user_point[log.user.id] = log.change_point
+            user_point[log.user_id] = log.change_point
+
+    # 读取完毕后再获取昵称，避免在查询过程中调用平台API
+    await prefetch_nicknames(bot, platform_user_ids.values(), season.group.platform_group_id)
+
+    async def map_user(user_id: int) -> str:
+        platform_user_id = platform_user_ids[user_id]
+        return (f"{await get_user_nickname(bot, platform_user_id, season.group.platform_group_id)}"
+                f" ({platform_user_id.real_id})")
+
+    for (user_id, idx), name in zip(user_idx.items(), await map_concurrently(map_user, user_idx.keys())):
+        table[idx][0] = name
 
     # 将行（用户）按pt排序
     ordered_user_idx = []
@@ -63,3 +80,5 @@ async def write_season_user_point_change_logs_csv(f: TextIO, logs: Iterable[Seas
 
     writer = csv.writer(f)
     writer.writerows(new_table)
+
+    return len(user_idx)
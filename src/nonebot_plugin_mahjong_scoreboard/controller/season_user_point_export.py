@@ -1,5 +1,4 @@
 from datetime import datetime
-from io import StringIO
 
 import tzlocal
 from ssttkkl_nonebot_utils.errors.errors import QueryError
@@ -9,9 +8,9 @@ from .mapper.season_user_point_csv_mapper import write_season_user_point_change_
 from .mg import matcher_group
 from .utils.dep import SeasonFromUnaryArgOrRunningSeason
 from .utils.general_handlers import require_store_command_args, require_platform_group_id
-from .utils.send_csv import send_csv
+from .utils.send_csv import send_csv, spooled_csv_file
 from ..model import Season, SeasonState
-from ..service.season_user_point_service import get_season_user_point_change_logs
+from ..service.season_user_point_service import get_season_user_point_change_log_rows
 from ..utils.date import encode_date
 from ..utils.nonebot import default_cmd_start
 
@@ -26,11 +25,6 @@ require_platform_group_id(export_season_ranking_matcher)
 @export_season_ranking_matcher.handle()
 @handle_error()
 async def export_season_ranking(season: Season = SeasonFromUnaryArgOrRunningSeason()):
-    logs = await get_season_user_point_change_logs(season.id)
-
-    if len(logs) == 0:
-        raise QueryError("还没有用户参与该赛季")
-
     filename = f"赛季榜单 {season.name}"
     if season.state == SeasonState.finished:
         filename += "（已结束）"
@@ -39,7 +33,11 @@ async def export_season_ranking(season: Season = SeasonFromUnaryArgOrRunningSeas
         filename += f"（截至{encode_date(now)}）"
     filename += ".csv"
 
-    with StringIO() as sio:
-        await write_season_user_point_change_logs_csv(sio, logs, season)
-        sio.seek(0)
-        await send_csv(sio, filename)
+    with spooled_csv_file() as f:
+        logs = get_season_user_point_change_log_rows(season.id)
+        user_cnt = await write_season_user_point_change_logs_csv(f, logs, season)
+        if user_cnt == 0:
+            raise QueryError("还没有用户参与该赛季")
+
+        f.seek(0)
+        await send_csv(f, filename)
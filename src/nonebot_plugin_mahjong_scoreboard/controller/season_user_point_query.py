@@ -15,7 +15,7 @@ from .utils.general_handlers import require_store_command_args, require_platform
 from .utils.send_msg import send_msg
 from ..model import Season, User, SeasonUserPoint
 from ..service.season_user_point_service import get_season_user_point, get_season_user_points
-from ..utils.nickname import get_user_nickname
+from ..utils.nickname import get_user_nickname, prefetch_nicknames
 from ..utils.nonebot import default_cmd_start
 
 # ========== 查询PT ==========
@@ -59,6 +59,8 @@ async def map_sup(sup: SeasonUserPoint, season: Season):
 @handle_error()
 async def query_season_ranking(season: Season = SeasonFromUnaryArgOrRunningSeason()):
     sups = await get_season_user_points(season.id)
+    await prefetch_nicknames(current_bot.get(), [x.user.platform_user_id for x in sups],
+                             season.group.platform_group_id)
 
     msgs = await map_pagination(sups, lambda x: map_sup(x, season))
 
@@ -1,4 +1,3 @@
-from asyncio import Lock
 from typing import Optional, Callable
 
 from nonebot import Bot
@@ -9,11 +8,11 @@ from nonebot.params import CommandArg
 from nonebot_plugin_session import extract_session, Session
 from ssttkkl_nonebot_utils.errors.errors import BadRequestError, QueryError
 from ssttkkl_nonebot_utils.interceptor.handle_error import handle_error
-from ssttkkl_nonebot_utils.platform import platform_func
 
 from .message import split_message
 from ...model import Group
 from ...model.identity import get_platform_group_id, get_platform_user_id
+from ...repository import session_mutex
 from ...service.group_service import get_group, is_group_admin
 from ...service.season_service import get_group_running_season, get_season_by_code
 from ...service.user_service import get_user
@@ -58,9 +57,7 @@ def GroupDep(*, lookup_matcher_state: bool = True,
             else:
                 return None
 
-        if "db_mutex" not in matcher.state:
-            matcher.state["db_mutex"] = Lock()
-        async with matcher.state["db_mutex"]:
+        async with session_mutex(matcher):
             return await get_group(platform_group_id)
 
     return Depends(dependency)
@@ -95,9 +92,7 @@ def UserDep(*, lookup_matcher_state: bool = True,
             else:
                 return None
 
-        if "db_mutex" not in matcher.state:
-            matcher.state["db_mutex"] = Lock()
-        async with matcher.state["db_mutex"]:
+        async with session_mutex(matcher):
             return await get_user(platform_user_id)
 
     return Depends(dependency)
@@ -113,9 +108,7 @@ def RunningSeasonDep(*, group_lookup_matcher_state: bool = True,
     @handle_error()
     async def dependency(matcher: Matcher, group=GroupDep(lookup_matcher_state=group_lookup_matcher_state,
                                                           lookup_matcher_state_key=group_lookup_matcher_state_key)):
-        if "db_mutex" not in matcher.state:
-            matcher.state["db_mutex"] = Lock()
-        async with matcher.state["db_mutex"]:
+        async with session_mutex(matcher):
             season = await get_group_running_season(group.id)
             if season is None and raise_on_missing:
                 raise QueryError("当前没有运行中的赛季")
@@ -151,6 +144,8 @@ def MentionUserArg(*, lookup_matcher_state: bool = True,
                    event: Event,
                    args=SplitCommandArgs(lookup_matcher_state=lookup_matcher_state,
                                          lookup_matcher_state_key=lookup_matcher_state_key)):
+        from ssttkkl_nonebot_utils.platform import platform_func
+
         for arg in args:
             x = platform_func(bot).extract_mention_user(arg)
             if x is not None:
@@ -167,9 +162,7 @@ def SeasonFromUnaryArgOrRunningSeason(*, unary_arg_lookup_matcher_state: bool =
     async def dependency(matcher: Matcher, group: Group = GroupDep(),
                          season_code=UnaryArg(lookup_matcher_state=unary_arg_lookup_matcher_state,
                                               lookup_matcher_state_key=unary_arg_lookup_matcher_state_key)):
-        if "db_mutex" not in matcher.state:
-            matcher.state["db_mutex"] = Lock()
-        async with matcher.state["db_mutex"]:
+        async with session_mutex(matcher):
             if season_code:
                 season = await get_season_by_code(season_code, group.id)
                 if season is None:
@@ -1,10 +1,15 @@
+import codecs
 import csv
+import json
+from functools import cache
 from pathlib import Path
+from tempfile import SpooledTemporaryFile
 from typing import TextIO
 
 from nonebot import require, logger
 from nonebot.internal.matcher import current_bot, current_event, current_matcher
-from ssttkkl_nonebot_utils.platform import platform_func
+
+from ...utils.render_cache import render_cache, render_cache_key
 
 
 def try_import() -> bool:
@@ -20,6 +25,30 @@ def try_import() -> bool:
 template_path = str(Path(__file__).parent.parent / "templates")
 
 
+@cache
+def _read_template(name: str) -> str:
+    # 模板内容也作为渲染缓存键的一部分
+    return (Path(template_path) / name).read_text(encoding="utf-8")
+
+
+# CSV超过该大小后写入临时文件
+CSV_SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def spooled_csv_file() -> TextIO:
+    return SpooledTemporaryFile(max_size=CSV_SPOOL_MAX_SIZE, mode="w+", encoding="utf_8", newline="")
+
+
+def _encode_csv(f: TextIO, chunk_size: int = 64 * 1024) -> bytes:
+    # 分块编码，避免同时持有完整的str与bytes
+    encoder = codecs.getincrementalencoder("utf_8_sig")()
+    data = bytearray()
+    while chunk := f.read(chunk_size):
+        data += encoder.encode(chunk)
+    data += encoder.encode("", final=True)
+    return bytes(data)
+
+
 def pad_row(row, num: int):
     row = [*row]
 
@@ -46,20 +75,24 @@ async def convert_csv_to_pic(f: TextIO) -> bytes:
     t.add_rows(rows[1:])
 
     html = t.get_html_string()
-    image = await template_to_pic(
+    viewport = {"width": column_num * 100, "height": 10}
+    key = render_cache_key("table.html", _read_template("table.html"), _read_template("style.css"),
+                           json.dumps(viewport), html)
+    return await render_cache.get_or_render(key, lambda: template_to_pic(
         template_path=template_path,
         template_name="table.html",
         templates={"body": html},
-        pages={"viewport": {"width": column_num * 100, "height": 10}})
-    return image
+        pages={"viewport": viewport}))
 
 
 async def send_csv(f: TextIO, filename: str):
+    from ssttkkl_nonebot_utils.platform import platform_func
+
     bot = current_bot.get()
     event = current_event.get()
     matcher = current_matcher.get()
     if platform_func.is_supported(bot, "upload_file"):
-        data = f.read().encode("utf_8_sig")
+        data = _encode_csv(f)
         await platform_func(bot).upload_file(bot, event, filename, data)
     else:
         if not try_import():
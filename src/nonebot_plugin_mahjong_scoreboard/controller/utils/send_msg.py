@@ -1,10 +1,17 @@
+from importlib.util import find_spec
+
 from nonebot import require
 from nonebot.internal.matcher import current_matcher, current_bot, current_event
-from ssttkkl_nonebot_utils.platform import platform_func
 
 from ...config import conf
+from ...utils.render_cache import render_cache, render_cache_key
+
+# 启动时只检查依赖是否已安装，首次发送图片时才加载htmlrender（浏览器也在首次渲染时才启动）
+if conf.mahjong_scoreboard_send_image and find_spec("nonebot_plugin_htmlrender") is None:
+    raise Exception("请安装 nonebot-plugin-mahjong-scoreboard[htmlrender]")
+
 
-if conf.mahjong_scoreboard_send_image:
+def _require_htmlrender():
     try:
         require("nonebot_plugin_htmlrender")
         require("nonebot_plugin_saa")
@@ -15,6 +22,8 @@ if conf.mahjong_scoreboard_send_image:
 async def send_msg(*msg: str):
     matcher = current_matcher.get()
     if not conf.mahjong_scoreboard_send_image:
+        from ssttkkl_nonebot_utils.platform import platform_func
+
         if conf.mahjong_scoreboard_send_forward_message:
             bot = current_bot.get()
             event = current_event.get()
@@ -23,9 +32,13 @@ async def send_msg(*msg: str):
             for s in msg:
                 await matcher.send(s)
     else:
+        _require_htmlrender()
+
         from nonebot_plugin_htmlrender import text_to_pic
         from nonebot_plugin_saa import MessageFactory, Image
 
-        image = await text_to_pic(text="\n\n".join(msg))
+        text = "\n\n".join(msg)
+        image = await render_cache.get_or_render(render_cache_key("text_to_pic", text),
+                                                 lambda: text_to_pic(text=text))
 
         await MessageFactory(Image(image)).send(reply=True)
@@ -1,6 +1,7 @@
 from datetime import datetime
 from enum import Enum
-from typing import Optional, NamedTuple, List
+from functools import lru_cache
+from typing import Optional, NamedTuple, List, Tuple, Dict
 
 from pydantic import BaseModel, conlist
 
@@ -80,12 +81,12 @@ class SeasonConfig(BaseModel):
     半庄战返点（多于起点的部分将作为头名赏）
     """
 
-    south_game_horse_point: Optional[List[int]] = None
+    south_game_horse_point: Optional[Tuple[int, ...]] = None
     """
     半庄战顺位点（绝对顺位点或马点）
     """
 
-    south_game_overwater_point: Optional[List[List[int]]] = None
+    south_game_overwater_point: Optional[Tuple[Tuple[int, ...], ...]] = None
     """
     半庄战水上顺位点
     """
@@ -105,12 +106,12 @@ class SeasonConfig(BaseModel):
     东风战返点（多于起点的部分将作为头名赏）
     """
 
-    east_game_horse_point: List[int]
+    east_game_horse_point: Tuple[int, ...]
     """
     东风战顺位点（绝对顺位点或马点）
     """
 
-    east_game_overwater_point: Optional[List[List[int]]] = None
+    east_game_overwater_point: Optional[Tuple[Tuple[int, ...], ...]] = None
     """
     东风战水上顺位点
     """
@@ -120,6 +121,54 @@ class SeasonConfig(BaseModel):
     PT精度：精确到10^point_precision
     """
 
+    class Config:
+        # 不可变且可哈希，以便在多个赛季/多次加载间共享同一实例
+        frozen = True
+
+    def get_scoring_params(self, player_and_wind: PlayerAndWind) -> "ScoringParams":
+        """
+        获取该对局类型的计分参数（每个配置只编译一次）
+        """
+        params = _compile_scoring_params(self).get(player_and_wind)
+        if params is None:
+            raise ValueError("invalid players and wind")
+        return params
+
+
+class ScoringParams(NamedTuple):
+    """
+    某一对局类型的计分参数
+    """
+    initial_point: Optional[int]
+    """
+    起点
+    """
+
+    origin_point: Optional[int]
+    """
+    返点
+    """
+
+    horse_point: Optional[Tuple[int, ...]]
+    """
+    顺位点（绝对顺位点或马点）
+    """
+
+    overwater_point: Optional[Tuple[Tuple[int, ...], ...]]
+    """
+    水上顺位点
+    """
+
+
+@lru_cache(maxsize=256)
+def _compile_scoring_params(config: SeasonConfig) -> Dict[PlayerAndWind, ScoringParams]:
+    return {
+        PlayerAndWind.four_men_east: ScoringParams(config.east_game_initial_point, config.east_game_origin_point,
+                                                   config.east_game_horse_point, config.east_game_overwater_point),
+        PlayerAndWind.four_men_south: ScoringParams(config.south_game_initial_point, config.south_game_origin_point,
+                                                    config.south_game_horse_point, config.south_game_overwater_point),
+    }
+
 
 class Season(BaseModel):
     id: int
@@ -179,6 +228,19 @@ class SeasonUserPointChangeLog(BaseModel):
     create_time: datetime
 
 
+class SeasonUserPointChangeLogRow(NamedTuple):
+    """
+    PT变动记录的扁平投影（用于导出，不构造关联的对局）
+    """
+    user_id: int
+    platform_user_id: PlatformId
+    change_type: SeasonUserPointChangeType
+    change_point: int
+    related_game_id: Optional[int]
+    related_game_code: Optional[int]
+    create_time: datetime
+
+
 class GameStatistics(NamedTuple):
     total: int
     total_east: int
@@ -190,5 +252,5 @@ class GameStatistics(NamedTuple):
 
 
 __all__ = ("PlayerAndWind", "GameState", "SeasonState", "SeasonUserPointChangeType", "RankPointPolicy",
-           "Wind", "SeasonConfig", "Season", "GameRecord", "GameProgress", "Game",
-           "SeasonUserPoint", "SeasonUserPointChangeLog", "GameStatistics")
+           "Wind", "SeasonConfig", "ScoringParams", "Season", "GameRecord", "GameProgress", "Game",
+           "SeasonUserPoint", "SeasonUserPointChangeLog", "SeasonUserPointChangeLogRow", "GameStatistics")
@@ -1,5 +1,7 @@
 from . import game
 from . import group
 from . import season
+from . import statistics
 from . import user
-from ._data_source import data_source
+from ._data_source import data_source, session_mutex, begin_write, write_transaction, \
+    on_transaction_end, is_migrating
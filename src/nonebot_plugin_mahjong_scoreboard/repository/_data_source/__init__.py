@@ -1,39 +1,39 @@
 from asyncio import Lock
 
-from nonebot import logger
-from nonebot.internal.matcher import current_matcher
+from nonebot.internal.matcher import current_matcher, Matcher
 
 from .data_source import data_source
-from .metainfo import set_metainfo, get_metainfo, APP_DB_VERSION
-from .migrations import migrations
+from .migrate import is_migrating
+from .sqlite import begin_write
+from .transaction import write_transaction, on_transaction_end
+
+
+_SESSION_MUTEX_KEY = "db_mutex"
+
+
+def session_mutex(matcher: Matcher) -> Lock:
+    """
+    同一matcher的各依赖会被并发求解，但共用同一个session，需通过该锁串行使用session。
+    不同群组之间的写操作由service层按群组/对局加锁串行化
+    """
+    if _SESSION_MUTEX_KEY not in matcher.state:
+        matcher.state[_SESSION_MUTEX_KEY] = Lock()
+    return matcher.state[_SESSION_MUTEX_KEY]
 
 
 @data_source.on_remove_session
 async def acquire_mutex():
     matcher = current_matcher.get()
-    if "db_mutex" in matcher.state:
-        db_mutex: Lock = matcher.state["db_mutex"]
-        await db_mutex.acquire()
+    if _SESSION_MUTEX_KEY in matcher.state:
+        await matcher.state[_SESSION_MUTEX_KEY].acquire()
 
 
 @data_source.on_session_removed
 def release_mutex():
     matcher = current_matcher.get()
-    if "db_mutex" in matcher.state:
-        db_mutex: Lock = matcher.state["db_mutex"]
-        db_mutex.release()
-
-
-@data_source.on_ready
-async def do_migrate():
-    cur_db_version = await get_metainfo('db_version')
-    while cur_db_version < APP_DB_VERSION:
-        mig = migrations[cur_db_version, cur_db_version + 1]
-        await mig()
-        await set_metainfo('db_version', cur_db_version + 1)
-        logger.success(f"migrate database from version {cur_db_version} to version {cur_db_version + 1}")
-
-        cur_db_version += 1
+    if _SESSION_MUTEX_KEY in matcher.state:
+        matcher.state[_SESSION_MUTEX_KEY].release()
 
 
-__all__ = ("data_source",)
+__all__ = ("data_source", "session_mutex", "begin_write", "write_transaction", "on_transaction_end",
+           "is_migrating")
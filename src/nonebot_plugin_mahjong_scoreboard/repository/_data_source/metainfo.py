@@ -1,10 +1,10 @@
-from sqlalchemy import JSON, inspect, select
+from sqlalchemy import JSON, inspect, select, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .data_source import data_source
 
-APP_DB_VERSION = 4
+APP_DB_VERSION = 8
 
 
 @data_source.registry.mapped
@@ -15,30 +15,42 @@ class MetaInfoOrm:
     value: Mapped[any] = mapped_column(JSON)
 
 
-async def get_metainfo(key: str) -> any:
+async def get_metainfo(key: str, default: any = None) -> any:
     async with AsyncSession(data_source.engine) as session:
         record = await session.get(MetaInfoOrm, key)
+        if record is None:
+            return default
         return record.value
 
 
+async def put_metainfo(session: AsyncSession, key: str, value: any):
+    """
+    在session当前事务中写入metainfo（不提交事务），value为None时删除该项
+    """
+    record = await session.get(MetaInfoOrm, key)
+    if value is None:
+        if record is not None:
+            await session.delete(record)
+    elif record is None:
+        session.add(MetaInfoOrm(key=key, value=value))
+    else:
+        record.value = value
+
+
 async def set_metainfo(key: str, value: any):
     async with AsyncSession(data_source.engine) as session:
-        record = await session.get(MetaInfoOrm, key)
-        if record is None:
-            record = MetaInfoOrm(key=key, value=value)
-            session.add(record)
-
-        record.value = value
+        await put_metainfo(session, key, value)
         await session.commit()
 
 
 @data_source.on_engine_created
 async def initialize_metainfo():
+    # 建表、判断是否初次建库与写入db_version在同一个连接（事务）中完成
     async with data_source.engine.begin() as conn:
         await conn.run_sync(lambda conn: MetaInfoOrm.__table__.create(conn, checkfirst=True))
 
-    async with data_source.engine.begin() as conn:
-        async with AsyncSession(data_source.engine, expire_on_commit=False) as session:
+        stmt = select(MetaInfoOrm.key).where(MetaInfoOrm.key == "db_version")
+        if (await conn.execute(stmt)).scalar_one_or_none() is None:
             # 判断是否初次建库
             blank_database = not await conn.run_sync(lambda conn: inspect(conn).has_table("games"))
             if blank_database:
@@ -46,11 +58,4 @@ async def initialize_metainfo():
             else:
                 insert_db_version = 1
 
-            stmt = select(MetaInfoOrm).where(MetaInfoOrm.key == "db_version")
-            result = (await session.execute(stmt)).scalar_one_or_none()
-            if result is None:
-                result = MetaInfoOrm(key="db_version", value=insert_db_version)
-                session.add(result)
-                await session.commit()
-
-        await conn.commit()
+            await conn.execute(insert(MetaInfoOrm).values(key="db_version", value=insert_db_version))
@@ -0,0 +1,169 @@
+from asyncio import create_task, Task
+from typing import Optional, Dict, Any, List, Sequence
+
+from nonebot import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .data_source import data_source
+from .metainfo import get_metainfo, put_metainfo, APP_DB_VERSION
+from .migrations import migrations, Migration
+from .migrations.batched import BatchedMigration
+from .sqlite import begin_write
+from ...config import conf
+
+
+def _steps(mig: Migration) -> Sequence:
+    if isinstance(mig, (list, tuple)):
+        return mig
+    return [mig]
+
+
+_online_migrations: Dict[str, BatchedMigration] = {
+    step.name: step
+    for steps in migrations.values()
+    for step in _steps(steps)
+    if isinstance(step, BatchedMigration) and step.online
+}
+
+_online_migrating = False
+_online_migration_task: Optional[Task] = None
+
+
+def is_migrating() -> bool:
+    """
+    是否有在后台执行的数据迁移尚未完成，此时只能执行查询操作
+    """
+    return _online_migrating
+
+
+def _checkpoint_key(migration: BatchedMigration) -> str:
+    return f"migration_checkpoint_{migration.name}"
+
+
+async def _commit_metainfo(values: Dict[str, Any]):
+    async with AsyncSession(data_source.engine) as session:
+        await begin_write(session)
+        for key, value in values.items():
+            await put_metainfo(session, key, value)
+        await session.commit()
+
+
+async def run_batched_migration(migration: BatchedMigration, on_finished: Dict[str, Any]):
+    """
+    从检查点开始分批执行迁移，在最后一批的事务中一并写入on_finished中的metainfo
+    """
+    key = _checkpoint_key(migration)
+    progress = await get_metainfo(key, {"checkpoint": None, "processed": 0})
+    checkpoint, processed = progress["checkpoint"], progress["processed"]
+    migration.checkpoint = checkpoint
+
+    if conf.mahjong_scoreboard_migration_batch_size:
+        migration.batch_size = conf.mahjong_scoreboard_migration_batch_size
+
+    async with AsyncSession(data_source.engine) as session:
+        total = await migration.count(session)
+
+    if checkpoint is not None:
+        logger.info(f"resume migration {migration.name} from checkpoint {checkpoint} ({processed}/{total})")
+
+    while True:
+        async with AsyncSession(data_source.engine) as session:
+            await begin_write(session)
+            checkpoint, cnt = await migration.run_batch(session, checkpoint)
+            processed += cnt
+
+            if checkpoint is None:
+                await put_metainfo(session, key, None)
+                for k, v in on_finished.items():
+                    await put_metainfo(session, k, v)
+            else:
+                await put_metainfo(session, key, {"checkpoint": checkpoint, "processed": processed})
+            await session.commit()
+
+        logger.info(f"migration {migration.name}: {processed}/{total}")
+        if checkpoint is None:
+            migration.pending = False
+            break
+        migration.checkpoint = checkpoint
+
+
+async def _run_online_migrations(names: List[str]):
+    global _online_migrating
+
+    try:
+        for name in names:
+            pending = await get_metainfo("online_migrations", [])
+            await run_batched_migration(_online_migrations[name],
+                                        {"online_migrations": [x for x in pending if x != name] or None})
+            logger.success(f"online migration {name} finished")
+    except Exception as e:
+        logger.opt(exception=e).error("online migration failed, it will be resumed on next startup")
+    finally:
+        # 迁移失败时也要恢复写操作，未完成的部分在下次启动时从检查点继续。
+        # 在此之前，依赖迁移结果的写操作需通过migration.pending及checkpoint判断数据是否已迁移
+        _online_migrating = False
+
+
+async def complete_online_migration(session: AsyncSession, migration: BatchedMigration):
+    """
+    在session当前事务中将未完成的后台迁移标记为已完成（不提交事务），用于已通过其他方式得到迁移结果的情况
+    """
+    from .transaction import on_transaction_end
+
+    if not migration.pending:
+        return
+
+    pending = await get_metainfo("online_migrations", [])
+    await put_metainfo(session, "online_migrations", [x for x in pending if x != migration.name] or None)
+    await put_metainfo(session, _checkpoint_key(migration), None)
+
+    def on_commit():
+        migration.pending = False
+
+    on_transaction_end(session, on_commit)
+
+
+@data_source.on_ready
+async def do_migrate():
+    global _online_migrating, _online_migration_task
+
+    cur_db_version = await get_metainfo('db_version')
+    while cur_db_version < APP_DB_VERSION:
+        steps = _steps(migrations[cur_db_version, cur_db_version + 1])
+        start = await get_metainfo('migration_step', 0)
+
+        for i in range(start, len(steps)):
+            step = steps[i]
+            on_finished = {'migration_step': i + 1}
+
+            if isinstance(step, BatchedMigration) and step.online:
+                pending = await get_metainfo('online_migrations', [])
+                if step.name not in pending:
+                    on_finished['online_migrations'] = [*pending, step.name]
+                await _commit_metainfo(on_finished)
+            elif isinstance(step, BatchedMigration):
+                await run_batched_migration(step, on_finished)
+            else:
+                # 步骤与记录进度在同一事务中提交，中断后不会重复执行已提交的步骤
+                async with data_source.engine.begin() as conn:
+                    await step(conn)
+                    async with AsyncSession(bind=conn) as session:
+                        for key, value in on_finished.items():
+                            await put_metainfo(session, key, value)
+                        await session.flush()
+
+        await _commit_metainfo({'db_version': cur_db_version + 1, 'migration_step': None})
+        logger.success(f"migrate database from version {cur_db_version} to version {cur_db_version + 1}")
+
+        cur_db_version += 1
+
+    pending = await get_metainfo('online_migrations', [])
+    if len(pending) > 0:
+        logger.info(f"running online migrations in background: {', '.join(pending)}")
+        for name in pending:
+            _online_migrations[name].pending = True
+        _online_migrating = True
+        _online_migration_task = create_task(_run_online_migrations(pending))
+
+
+__all__ = ("is_migrating", "complete_online_migration")
@@ -1,9 +1,27 @@
+from typing import Callable, Awaitable, Union, Sequence, Dict, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .batched import BatchedMigration
 from .v1_to_v2 import migrate_v1_to_v2
 from .v2_to_v3 import migrate_v2_to_v3
 from .v3_to_v4 import migrate_v3_to_v4
+from .v4_to_v5 import migrate_v4_to_v5
+from .v5_to_v6 import migrate_v5_to_v6
+from .v6_to_v7 import migrate_v6_to_v7
+from .v7_to_v8 import migrate_v7_to_v8
+
+# 每个版本的迁移由一个或多个步骤组成，按顺序执行。
+# 步骤为在给定连接（事务）中执行的异步函数（与记录进度在同一事务中提交），或分批执行的数据迁移
+MigrationStep = Union[Callable[[AsyncConnection], Awaitable[None]], BatchedMigration]
+Migration = Union[MigrationStep, Sequence[MigrationStep]]
 
-migrations = {
+migrations: Dict[Tuple[int, int], Migration] = {
     (1, 2): migrate_v1_to_v2,
     (2, 3): migrate_v2_to_v3,
     (3, 4): migrate_v3_to_v4,
+    (4, 5): migrate_v4_to_v5,
+    (5, 6): migrate_v5_to_v6,
+    (6, 7): migrate_v6_to_v7,
+    (7, 8): migrate_v7_to_v8,
 }
@@ -0,0 +1,37 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class BatchedMigration(ABC):
+    """
+    分批执行的数据迁移。
+
+    每批数据在单独的事务中处理，并在同一事务中将检查点写入metainfo，迁移中断后从检查点继续。
+    online为True的迁移在插件启动后于后台执行，执行期间只能执行查询操作；之后的迁移不能依赖其结果
+    """
+    name: str
+    batch_size: int = 500
+    online: bool = False
+
+    # 运行时状态：是否尚未完成（仅在后台执行的迁移会被置为True），以及最近一次提交的检查点
+    pending: bool = False
+    checkpoint: Optional[int] = None
+
+    async def count(self, session: AsyncSession) -> Optional[int]:
+        """
+        需要迁移的数据总量，仅用于输出进度
+        """
+        return None
+
+    @abstractmethod
+    async def run_batch(self, session: AsyncSession, checkpoint: Optional[int]) -> Tuple[Optional[int], int]:
+        """
+        处理检查点之后的至多batch_size条数据（不提交事务）
+        :return: 新的检查点（没有剩余数据时为None），以及本批处理的数据量
+        """
+        raise NotImplementedError()
+
+
+__all__ = ("BatchedMigration",)
@@ -1,8 +1,6 @@
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
 
-from ..data_source import data_source
 
-
-async def migrate_v1_to_v2():
-    async with data_source.engine.begin() as conn:
-        await conn.execute(text("ALTER TABLE game_records ADD point_scale integer NOT NULL DEFAULT 0;"))
+async def migrate_v1_to_v2(conn: AsyncConnection):
+    await conn.execute(text("ALTER TABLE game_records ADD point_scale integer NOT NULL DEFAULT 0;"))
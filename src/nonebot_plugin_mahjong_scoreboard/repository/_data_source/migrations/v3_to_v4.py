@@ -1,25 +1,46 @@
-from sqlalchemy import select, update
+from typing import Optional, Tuple
+
+from sqlalchemy import select, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .batched import BatchedMigration
 from ....model import RankPointPolicy
 
 
-async def migrate_v3_to_v4():
-    from ..data_source import data_source
-    from ...data_model import SeasonOrm
+class SeasonConfigMigration(BatchedMigration):
+    name = "v3_to_v4_season_config"
+
+    async def count(self, session: AsyncSession) -> Optional[int]:
+        from ...data_model import SeasonOrm
+
+        return (await session.execute(select(func.count(SeasonOrm.id)))).scalar_one()
+
+    async def run_batch(self, session: AsyncSession, checkpoint: Optional[int]) -> Tuple[Optional[int], int]:
+        from ...data_model import SeasonOrm
 
-    async with AsyncSession(data_source.engine) as sess:
-        result = await sess.execute(select(SeasonOrm.id, SeasonOrm.config))
-        for (id_, config) in result.all():
+        stmt = select(SeasonOrm.id, SeasonOrm.config).order_by(SeasonOrm.id).limit(self.batch_size)
+        if checkpoint is not None:
+            stmt = stmt.where(SeasonOrm.id > checkpoint)
+        rows = (await session.execute(stmt)).all()
+
+        for (id_, config) in rows:
             scale = 10 ** -config.point_precision
-            config.rank_point_policy = RankPointPolicy.horse_point
+            # SeasonConfig不可变，通过copy修改
+            update_fields = dict(rank_point_policy=RankPointPolicy.horse_point)
             if config.south_game_enabled:
-                config.south_game_initial_point = 25000
-                config.south_game_horse_point = [x * scale for x in config.south_game_horse_point]
+                update_fields["south_game_initial_point"] = 25000
+                update_fields["south_game_horse_point"] = [x * scale for x in config.south_game_horse_point]
             if config.east_game_enabled:
-                config.east_game_initial_point = 25000
-                config.east_game_horse_point = [x * scale for x in config.east_game_horse_point]
+                update_fields["east_game_initial_point"] = 25000
+                update_fields["east_game_horse_point"] = [x * scale for x in config.east_game_horse_point]
+            config = config.copy(update=update_fields)
 
             stmt = update(SeasonOrm).where(SeasonOrm.id == id_).values(config=config)
-            await sess.execute(stmt)
-        await sess.commit()
+            await session.execute(stmt)
+
+        if len(rows) < self.batch_size:
+            return None, len(rows)
+        return rows[-1][0], len(rows)
+
+
+migrate_v3_to_v4 = [SeasonConfigMigration()]
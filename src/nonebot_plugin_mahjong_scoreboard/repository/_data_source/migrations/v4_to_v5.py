@@ -0,0 +1,13 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+
+async def migrate_v4_to_v5(conn: AsyncConnection):
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS game_records_user_id_game_id_idx "
+                            "ON game_records (user_id, game_id);"))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS season_user_point_change_logs_season_id_user_id_id_idx "
+                            "ON season_user_point_change_logs (season_id, user_id, id);"))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS season_user_points_season_id_point_idx "
+                            "ON season_user_points (season_id, point);"))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS games_group_id_create_time_idx "
+                            "ON games (group_id, create_time);"))
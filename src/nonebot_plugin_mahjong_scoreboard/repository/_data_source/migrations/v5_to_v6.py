@@ -0,0 +1,54 @@
+from typing import Optional, Tuple
+
+from sqlalchemy import text, select, func
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+
+from .batched import BatchedMigration
+
+
+async def add_season_user_point_columns(conn: AsyncConnection):
+    await conn.execute(text("ALTER TABLE season_user_points ADD last_change_log_id integer;"))
+    await conn.execute(text("ALTER TABLE season_user_points ADD change_count integer NOT NULL DEFAULT 0;"))
+
+
+class SeasonUserPointChangeLogMigration(BatchedMigration):
+    """
+    按赛季分批回填season_user_points的last_change_log_id与change_count
+    """
+    name = "v5_to_v6_season_user_point_change_log"
+    batch_size = 50
+
+    async def count(self, session: AsyncSession) -> Optional[int]:
+        from ...data_model import SeasonOrm
+
+        return (await session.execute(select(func.count(SeasonOrm.id)))).scalar_one()
+
+    async def run_batch(self, session: AsyncSession, checkpoint: Optional[int]) -> Tuple[Optional[int], int]:
+        from ...data_model import SeasonOrm
+
+        stmt = select(SeasonOrm.id).order_by(SeasonOrm.id).limit(self.batch_size)
+        if checkpoint is not None:
+            stmt = stmt.where(SeasonOrm.id > checkpoint)
+        season_ids = (await session.execute(stmt)).scalars().all()
+        if len(season_ids) == 0:
+            return None, 0
+
+        await session.execute(text("""
+            UPDATE season_user_points
+            SET last_change_log_id = (SELECT max(l.id)
+                                      FROM season_user_point_change_logs l
+                                      WHERE l.season_id = season_user_points.season_id
+                                        AND l.user_id = season_user_points.user_id),
+                change_count       = (SELECT count(l.id)
+                                      FROM season_user_point_change_logs l
+                                      WHERE l.season_id = season_user_points.season_id
+                                        AND l.user_id = season_user_points.user_id)
+            WHERE season_id BETWEEN :first AND :last;
+        """), {"first": season_ids[0], "last": season_ids[-1]})
+
+        if len(season_ids) < self.batch_size:
+            return None, len(season_ids)
+        return season_ids[-1], len(season_ids)
+
+
+migrate_v5_to_v6 = [add_season_user_point_columns, SeasonUserPointChangeLogMigration()]
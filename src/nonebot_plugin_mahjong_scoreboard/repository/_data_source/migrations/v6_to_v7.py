@@ -0,0 +1,49 @@
+from typing import Optional, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .batched import BatchedMigration
+
+
+class UserGameStatsMigration(BatchedMigration):
+    """
+    按群组分批根据已有对局计算对战数据（user_game_stats表已由create_all创建）。
+    对战数据缺失时查询会直接从对局记录中统计，因此可以在后台执行
+    """
+    name = "v6_to_v7_user_game_stats"
+    batch_size = 20
+    online = True
+
+    async def count(self, session: AsyncSession) -> Optional[int]:
+        from ...data_model import GroupOrm
+
+        return (await session.execute(select(func.count(GroupOrm.id)))).scalar_one()
+
+    async def run_batch(self, session: AsyncSession, checkpoint: Optional[int]) -> Tuple[Optional[int], int]:
+        from ...data_model import GroupOrm
+        from ...statistics import UserGameStatsRepository
+
+        stmt = select(GroupOrm.id).order_by(GroupOrm.id).limit(self.batch_size)
+        if checkpoint is not None:
+            stmt = stmt.where(GroupOrm.id > checkpoint)
+        group_ids = (await session.execute(stmt)).scalars().all()
+        if len(group_ids) == 0:
+            return None, 0
+
+        await UserGameStatsRepository(session).rebuild(group_ids)
+
+        if len(group_ids) < self.batch_size:
+            return None, len(group_ids)
+        return group_ids[-1], len(group_ids)
+
+    def is_group_migrated(self, group_id: int) -> bool:
+        """
+        该群组的对战数据是否已计算（按群组id顺序迁移，检查点及之前的群组已计算）
+        """
+        return not self.pending or (self.checkpoint is not None and group_id <= self.checkpoint)
+
+
+user_game_stats_migration = UserGameStatsMigration()
+
+migrate_v6_to_v7 = [user_game_stats_migration]
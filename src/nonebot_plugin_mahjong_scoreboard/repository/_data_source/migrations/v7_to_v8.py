@@ -0,0 +1,6 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+
+async def migrate_v7_to_v8(conn: AsyncConnection):
+    await conn.execute(text("ALTER TABLE games ADD version integer NOT NULL DEFAULT 1;"))
@@ -0,0 +1,78 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .data_source import data_source
+from ...config import conf
+
+# 连接的execution_options中该项为True时，以BEGIN IMMEDIATE开始事务
+SQLITE_BEGIN_IMMEDIATE = "sqlite_begin_immediate"
+
+_JOURNAL_MODES = {"delete", "truncate", "persist", "memory", "wal", "off"}
+_SYNCHRONOUS = {"off", "normal", "full", "extra"}
+
+
+def _get_sqlite_pragmas() -> list:
+    pragmas = []
+
+    journal_mode = conf.mahjong_scoreboard_sqlite_journal_mode
+    if journal_mode is not None:
+        if journal_mode.lower() not in _JOURNAL_MODES:
+            raise ValueError(f"invalid sqlite journal_mode: {journal_mode}")
+        pragmas.append(f"PRAGMA journal_mode={journal_mode}")
+
+    synchronous = conf.mahjong_scoreboard_sqlite_synchronous
+    if synchronous is not None:
+        if synchronous.lower() not in _SYNCHRONOUS:
+            raise ValueError(f"invalid sqlite synchronous: {synchronous}")
+        pragmas.append(f"PRAGMA synchronous={synchronous}")
+
+    for name, value in (("busy_timeout", conf.mahjong_scoreboard_sqlite_busy_timeout),
+                        ("cache_size", conf.mahjong_scoreboard_sqlite_cache_size),
+                        ("mmap_size", conf.mahjong_scoreboard_sqlite_mmap_size)):
+        if value is not None:
+            pragmas.append(f"PRAGMA {name}={int(value)}")
+
+    return pragmas
+
+
+@data_source.on_engine_created
+def setup_sqlite():
+    # 同步回调，保证在其他回调建立连接之前注册事件
+    if data_source.dialect != "sqlite":
+        return
+
+    pragmas = _get_sqlite_pragmas()
+    engine = data_source.engine.sync_engine
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # 禁用驱动自带的事务处理，由下方begin事件发出BEGIN
+        dbapi_connection.isolation_level = None
+
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def on_begin(conn):
+        if conn.get_execution_options().get(SQLITE_BEGIN_IMMEDIATE, False):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            conn.exec_driver_sql("BEGIN")
+
+
+async def begin_write(session: AsyncSession):
+    """
+    开始写事务。SQLite下以BEGIN IMMEDIATE开始事务，避免读事务升级为写事务时因其他连接持有锁而失败。
+    若session已处于事务中（如此前的依赖已读取数据），先提交该事务
+    """
+    if data_source.dialect != "sqlite":
+        return
+
+    if session.in_transaction():
+        await session.commit()
+    await session.connection(execution_options={SQLITE_BEGIN_IMMEDIATE: True})
+
+
+__all__ = ("begin_write",)
@@ -0,0 +1,59 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
+from ssttkkl_nonebot_utils.errors.errors import BadRequestError
+
+from .migrate import is_migrating
+from .sqlite import begin_write
+
+_TRANSACTION_HOOKS_KEY = "transaction_hooks"
+
+
+def on_transaction_end(session: AsyncSession,
+                       on_commit: Callable[[], None],
+                       on_rollback: Optional[Callable[[], None]] = None):
+    """
+    注册在session当前事务提交（或回滚）后执行的回调，用于在事务提交后才更新进程内的缓存
+    """
+    session.info.setdefault(_TRANSACTION_HOOKS_KEY, []).append((on_commit, on_rollback))
+
+
+@event.listens_for(Session, "after_commit")
+def _run_commit_hooks(session: Session):
+    for on_commit, _ in session.info.pop(_TRANSACTION_HOOKS_KEY, ()):
+        on_commit()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _run_rollback_hooks(session: Session, transaction: SessionTransaction):
+    # 提交时回调已在after_commit中执行并移除，此处剩余的回调属于被回滚（或未提交即关闭）的事务
+    if transaction.parent is not None:
+        return
+    for _, on_rollback in session.info.pop(_TRANSACTION_HOOKS_KEY, ()):
+        if on_rollback is not None:
+            on_rollback()
+
+
+@asynccontextmanager
+async def write_transaction(session: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """
+    以一个写事务执行其中的操作：正常退出时提交，发生异常时回滚（也避免在处理错误期间仍持有数据库的写锁）。
+    仓储的方法均不提交事务，由调用方通过该方法确定事务的边界
+    """
+    if is_migrating():
+        raise BadRequestError("正在迁移数据，暂时只能执行查询操作，请稍后重试")
+
+    await begin_write(session)
+    try:
+        yield session
+        await session.commit()
+    except BaseException:
+        if session.in_transaction():
+            await session.rollback()
+        raise
+
+
+__all__ = ("write_transaction", "on_transaction_end")
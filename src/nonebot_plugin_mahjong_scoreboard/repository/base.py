@@ -11,5 +11,23 @@ class Repository(Generic[T_Entity]):
     def __init__(self, session: AsyncSession):
         self.session = session
 
+    @property
+    def dialect(self) -> str:
+        return self.session.bind.dialect.name
+
+    @property
+    def supports_window_functions(self) -> bool:
+        dialect = self.session.bind.dialect
+        version = dialect.server_version_info
+        if version is None:
+            return True
+        elif dialect.name == 'sqlite':
+            return version >= (3, 25)
+        elif dialect.name == 'mysql' and not dialect.is_mariadb:
+            return version >= (8,)
+        elif dialect.name == 'mysql':
+            return version >= (10, 2)
+        return True
+
     async def get_by_pk(self, pk: any) -> Optional[T_Entity]:
         return await self.session.get(self.Entity, pk)
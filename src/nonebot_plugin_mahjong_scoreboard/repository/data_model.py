@@ -49,7 +49,7 @@ class SeasonOrm:
     start_time: Mapped[Optional[datetime]]
     finish_time: Mapped[Optional[datetime]]
 
-    config: Mapped[SeasonConfig] = mapped_column(PydanticModel(SeasonConfig))
+    config: Mapped[SeasonConfig] = mapped_column(PydanticModel(SeasonConfig, cache_size=256))
 
     accessible: Mapped[bool] = mapped_column(default=True)
     create_time: Mapped[datetime] = mapped_column(default=datetime.utcnow)
@@ -73,9 +73,17 @@ class SeasonUserPointOrm:
 
     point: Mapped[int] = mapped_column(default=0)
 
+    # 最近一次PT变动记录的ID及PT变动记录数，用于判断能否撤销结算
+    last_change_log_id: Mapped[Optional[int]]
+    change_count: Mapped[int] = mapped_column(default=0)
+
     create_time: Mapped[datetime] = mapped_column(default=datetime.utcnow)
     update_time: Mapped[datetime] = mapped_column(default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("season_user_points_season_id_point_idx", "season_id", "point"),
+    )
+
 
 @data_source.registry.mapped
 class SeasonUserPointChangeLogOrm:
@@ -99,6 +107,7 @@ class SeasonUserPointChangeLogOrm:
 
     __table_args__ = (
         Index("seasons_related_game_id_idx", "related_game_id"),
+        Index("season_user_point_change_logs_season_id_user_id_id_idx", "season_id", "user_id", "id"),
     )
 
 
@@ -124,13 +133,14 @@ class GameOrm:
                                                            default=PlayerAndWind.four_men_south)
     state: Mapped[GameState] = mapped_column(default=GameState.uncompleted)
 
+    # 不隐式加载，查询时通过GameRepository的load参数（GameLoadPlan）指定需要预加载的关联
     records: Mapped[List["GameRecordOrm"]] = relationship(foreign_keys='GameRecordOrm.game_id',
                                                           back_populates="game",
-                                                          lazy="selectin")
+                                                          lazy="raise")
 
     progress: Mapped[Optional["GameProgressOrm"]] = relationship(foreign_keys='GameProgressOrm.game_id',
                                                                  uselist=False,
-                                                                 lazy="joined")
+                                                                 lazy="raise")
 
     complete_time: Mapped[Optional[datetime]]
 
@@ -141,11 +151,19 @@ class GameOrm:
     update_time: Mapped[datetime] = mapped_column(default=datetime.utcnow)
     delete_time: Mapped[Optional[datetime]]
 
+    # 乐观锁版本号，每次UPDATE时自增，提交时若版本号已被其他事务修改则抛出StaleDataError
+    version: Mapped[int] = mapped_column(server_default="1")
+
     __table_args__ = (
         Index("games_season_id_idx", "season_id"),
-        Index("games_group_id_code_idx", "group_id", "code")
+        Index("games_group_id_code_idx", "group_id", "code"),
+        Index("games_group_id_create_time_idx", "group_id", "create_time"),
     )
 
+    __mapper_args__ = {
+        "version_id_col": version
+    }
+
 
 @data_source.registry.mapped
 class GameRecordOrm:
@@ -172,6 +190,10 @@ class GameRecordOrm:
 
     rank: Mapped[Optional[int]] = mapped_column("rnk")  # 排名
 
+    __table_args__ = (
+        Index("game_records_user_id_game_id_idx", "user_id", "game_id"),
+    )
+
 
 @data_source.registry.mapped
 class GameProgressOrm:
@@ -183,3 +205,25 @@ class GameProgressOrm:
 
     round: Mapped[int]
     honba: Mapped[int]
+
+
+@data_source.registry.mapped
+class UserGameStatsOrm:
+    __tablename__ = 'user_game_stats'
+
+    group_id: Mapped[int] = mapped_column(ForeignKey('groups.id'), primary_key=True)
+    # 为0时统计群组内所有对局，否则统计该赛季的对局
+    season_id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), primary_key=True)
+
+    total: Mapped[int] = mapped_column(default=0)
+    total_east: Mapped[int] = mapped_column(default=0)
+    total_south: Mapped[int] = mapped_column(default=0)
+
+    rank_1: Mapped[int] = mapped_column(default=0)
+    rank_2: Mapped[int] = mapped_column(default=0)
+    rank_3: Mapped[int] = mapped_column(default=0)
+    rank_4: Mapped[int] = mapped_column(default=0)
+
+    sum_point: Mapped[float] = mapped_column(default=0.0)
+    flying: Mapped[int] = mapped_column(default=0)
@@ -1,8 +1,10 @@
 from datetime import datetime, timedelta
-from typing import Optional, Tuple, overload
+from enum import IntFlag
+from typing import Optional, Tuple, overload, List, Set
 
 from sqlalchemy import update, Select, select, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.orm.interfaces import ORMOption
 
 from .base import Repository
 from .data_model import GameOrm, GameProgressOrm, GameRecordOrm
@@ -10,49 +12,108 @@ from .pagination import Page
 from ..model import GameState
 
 
+class GameLoadPlan(IntFlag):
+    """
+    查询对局时需要预加载的关联，未预加载的关联被访问时抛出异常
+    """
+    bare = 0
+    records = 1
+    progress = 2
+    full = records | progress
+
+    @property
+    def options(self) -> List[ORMOption]:
+        options = []
+        if self & GameLoadPlan.records:
+            options.append(selectinload(GameOrm.records))
+        if self & GameLoadPlan.progress:
+            options.append(joinedload(GameOrm.progress))
+        return options
+
+    @property
+    def attributes(self) -> Set[str]:
+        attrs = set()
+        if self & GameLoadPlan.records:
+            attrs.add("records")
+        if self & GameLoadPlan.progress:
+            attrs.add("progress")
+        return attrs
+
+
 class GameRepository(Repository[GameOrm]):
-    async def get_by_pk(self, pk: int) -> Optional[GameOrm]:
+    async def get_by_pk(self, pk: int, *, load: GameLoadPlan = GameLoadPlan.full) -> Optional[GameOrm]:
         stmt = select(GameOrm).where(
             GameOrm.id == pk,
             GameOrm.accessible
-        ).limit(1)
+        ).limit(1).options(*load.options)
         season = (await self.session.execute(stmt)).scalar_one_or_none()
         return season
 
     @staticmethod
-    def _build_game_query(stmt: Select,
-                          *, offset: Optional[int] = None,
-                          limit: Optional[int] = None,
-                          uncompleted_only: bool = False,
-                          completed_only: bool = False,
-                          reverse_order: bool = False,
-                          time_span: Optional[Tuple[datetime, datetime]] = None) -> Select:
+    def _filter_game_query(stmt: Select,
+                           group_id: Optional[int] = None,
+                           user_id: Optional[int] = None,
+                           season_id: Optional[int] = None,
+                           *, uncompleted_only: bool = False,
+                           completed_only: bool = False,
+                           time_span: Optional[Tuple[datetime, datetime]] = None) -> Select:
+        if group_id is not None:
+            stmt = stmt.where(GameOrm.group_id == group_id)
+
+        if user_id is not None:
+            stmt = stmt.join(GameRecordOrm).where(GameRecordOrm.user_id == user_id)
+
+        if season_id is not None:
+            stmt = stmt.where(GameOrm.season_id == season_id)
+
         if uncompleted_only:
             stmt = stmt.where(GameOrm.state != GameState.completed)
         elif completed_only:
             stmt = stmt.where(GameOrm.state == GameState.completed)
 
-        if reverse_order:
-            stmt = stmt.order_by(GameOrm.id.desc())
-        else:
-            stmt = stmt.order_by(GameOrm.id)
-
         if time_span:
             stmt = stmt.where(GameOrm.create_time >= time_span[0])
             stmt = stmt.where(GameOrm.create_time < time_span[1])
 
         stmt = stmt.where(GameOrm.accessible)
 
+        return stmt
+
+    @classmethod
+    def _build_game_query(cls, stmt: Select,
+                          *, group_id: Optional[int] = None,
+                          user_id: Optional[int] = None,
+                          season_id: Optional[int] = None,
+                          offset: Optional[int] = None,
+                          limit: Optional[int] = None,
+                          uncompleted_only: bool = False,
+                          completed_only: bool = False,
+                          reverse_order: bool = False,
+                          time_span: Optional[Tuple[datetime, datetime]] = None,
+                          load: GameLoadPlan = GameLoadPlan.full) -> Select:
+        stmt = cls._filter_game_query(stmt, group_id, user_id, season_id,
+                                      uncompleted_only=uncompleted_only,
+                                      completed_only=completed_only,
+                                      time_span=time_span)
+
+        if reverse_order:
+            stmt = stmt.order_by(GameOrm.id.desc())
+        else:
+            stmt = stmt.order_by(GameOrm.id)
+
         stmt = (stmt.offset(offset).limit(limit)
-                .options(selectinload(GameOrm.records)))
+                .options(*load.options))
 
         return stmt
 
-    async def get_by_code(self, game_code: int, group_id: int) -> Optional[GameOrm]:
+    async def get_by_code(self, game_code: int, group_id: int,
+                          *, load: GameLoadPlan = GameLoadPlan.full) -> Optional[GameOrm]:
         stmt = select(GameOrm).where(
             GameOrm.group_id == group_id, GameOrm.code == game_code
         )
-        stmt = self._build_game_query(stmt, limit=1)
+        stmt = self._build_game_query(stmt, limit=1, load=load)
+        # 对局可能已被其他session修改，不使用identity map中的旧状态
+        stmt = stmt.execution_options(populate_existing=True)
         game = (await self.session.execute(stmt)).scalar_one_or_none()
         return game
 
@@ -65,7 +126,8 @@ class GameRepository(Repository[GameOrm]):
                   offset: Optional[int] = None,
                   limit: Optional[int] = None,
                   reverse_order: bool = False,
-                  time_span: Optional[Tuple[datetime, datetime]] = None) -> Page[GameOrm]:
+                  time_span: Optional[Tuple[datetime, datetime]] = None,
+                  load: GameLoadPlan = GameLoadPlan.full) -> Page[GameOrm]:
         ...
 
     async def get(self, group_id: Optional[int] = None,
@@ -73,17 +135,7 @@ class GameRepository(Repository[GameOrm]):
                   season_id: Optional[int] = None,
                   **kwargs) -> Page[GameOrm]:
         stmt = select(GameOrm, func.count(GameOrm.id).over().label("total"))
-
-        if group_id is not None:
-            stmt = stmt.where(GameOrm.group_id == group_id)
-
-        if user_id is not None:
-            stmt = stmt.join(GameRecordOrm).where(GameRecordOrm.user_id == user_id)
-
-        if season_id is not None:
-            stmt = stmt.where(GameOrm.season_id == season_id)
-
-        stmt = self._build_game_query(stmt, **kwargs)
+        stmt = self._build_game_query(stmt, group_id=group_id, user_id=user_id, season_id=season_id, **kwargs)
 
         result = (await self.session.execute(stmt)).all()
 
@@ -94,6 +146,70 @@ class GameRepository(Repository[GameOrm]):
         else:
             return Page(data=[], total=0)
 
+    async def count(self, group_id: Optional[int] = None,
+                    user_id: Optional[int] = None,
+                    season_id: Optional[int] = None,
+                    *, uncompleted_only: bool = False,
+                    completed_only: bool = False,
+                    time_span: Optional[Tuple[datetime, datetime]] = None) -> int:
+        stmt = select(func.count(GameOrm.id))
+        stmt = self._filter_game_query(stmt, group_id, user_id, season_id,
+                                       uncompleted_only=uncompleted_only,
+                                       completed_only=completed_only,
+                                       time_span=time_span)
+        return (await self.session.execute(stmt)).scalar_one()
+
+    async def get_by_cursor(self, group_id: Optional[int] = None,
+                            user_id: Optional[int] = None,
+                            season_id: Optional[int] = None,
+                            *, cursor: Optional[int] = None,
+                            limit: Optional[int] = None,
+                            reverse_order: bool = False,
+                            with_total: bool = False,
+                            uncompleted_only: bool = False,
+                            completed_only: bool = False,
+                            time_span: Optional[Tuple[datetime, datetime]] = None,
+                            load: GameLoadPlan = GameLoadPlan.full) -> Page[GameOrm]:
+        """
+        基于GameOrm.id的游标分页
+
+        :param cursor: 上一页返回的next_cursor，为None时从头（reverse_order时为从尾）开始
+        :param limit: 每页数量，为None时返回剩余的全部对局
+        :param with_total: 是否额外查询符合条件的对局总数
+        :param load: 需要预加载的关联
+        """
+        filters = dict(uncompleted_only=uncompleted_only, completed_only=completed_only, time_span=time_span)
+
+        stmt = self._filter_game_query(select(GameOrm), group_id, user_id, season_id, **filters)
+
+        if reverse_order:
+            if cursor is not None:
+                stmt = stmt.where(GameOrm.id < cursor)
+            stmt = stmt.order_by(GameOrm.id.desc())
+        else:
+            if cursor is not None:
+                stmt = stmt.where(GameOrm.id > cursor)
+            stmt = stmt.order_by(GameOrm.id)
+
+        # 多取一条用于判断是否还有下一页
+        if limit is not None:
+            stmt = stmt.limit(limit + 1)
+
+        stmt = stmt.options(*load.options)
+
+        data = list((await self.session.execute(stmt)).scalars())
+
+        next_cursor = None
+        if limit is not None and len(data) > limit:
+            data = data[:limit]
+            next_cursor = data[-1].id
+
+        total = None
+        if with_total:
+            total = await self.count(group_id, user_id, season_id, **filters)
+
+        return Page(data=data, total=total, next_cursor=next_cursor)
+
     async def get_progress(self, game_id: int) -> Optional[GameProgressOrm]:
         return await self.session.get(GameProgressOrm, game_id)
 
@@ -105,11 +221,10 @@ class GameRepository(Repository[GameOrm]):
                        GameOrm.create_time < one_day_ago,
                        GameOrm.progress == None,
                        GameOrm.accessible)
-                .values(accessible=False, delete_time=now, update_time=now)
+                .values(accessible=False, delete_time=now, update_time=now, version=GameOrm.version + 1)
                 .execution_options(synchronize_session=False))
         result = await self.session.execute(stmt)
-        await self.session.commit()
         return result.rowcount
 
 
-__all__ = ("GameOrm",)
+__all__ = ("GameOrm", "GameLoadPlan")
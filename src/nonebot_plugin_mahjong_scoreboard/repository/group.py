@@ -1,25 +1,72 @@
-from typing import Optional
+from typing import Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import select, update, case
 
+from ._data_source import begin_write
 from .base import Repository
 from .data_model import GroupOrm
+from .platform_id_cache import platform_id_cache
 
 
 class GroupRepository(Repository[GroupOrm]):
     Entity = GroupOrm
 
     async def get(self, platform_group_id: str, *, insert_on_missing: bool = True) -> Optional[GroupOrm]:
-        stmt = select(GroupOrm).where(GroupOrm.platform_group_id == platform_group_id).limit(1)
-        result = await self.session.execute(stmt)
-        group = result.scalar_one_or_none()
-        if group is None and insert_on_missing:
-            group = GroupOrm(platform_group_id=platform_group_id)
-            self.session.add(group)
+        group_id = await self.get_id(platform_group_id, insert_on_missing=insert_on_missing)
+        if group_id is None:
+            return None
+        return await self.get_by_pk(group_id)
+
+    async def get_id(self, platform_group_id: str, *, insert_on_missing: bool = True) -> Optional[int]:
+        """
+        获取平台群组ID对应的群组ID（命中缓存时不查询数据库）
+        """
+        return await platform_id_cache.get("group", platform_group_id,
+                                           lambda: self._load_id(platform_group_id, insert_on_missing))
+
+    async def _load_id(self, platform_group_id: str, insert_on_missing: bool) -> Optional[int]:
+        stmt = select(GroupOrm.id).where(GroupOrm.platform_group_id == platform_group_id).limit(1)
+        group_id = (await self.session.execute(stmt)).scalar_one_or_none()
+        if group_id is None and insert_on_missing:
+            # 先取得写锁再插入（避免读事务升级为写事务时失败），并重新查询，期间可能已被其他连接插入
+            await begin_write(self.session)
+            group_id = (await self.session.execute(stmt)).scalar_one_or_none()
+            if group_id is None:
+                group = GroupOrm(platform_group_id=platform_group_id)
+                self.session.add(group)
+                await self.session.flush()
+                group_id = group.id
+            # 新建的ID会进入缓存并被其他session使用，因此须立即提交（同时释放写锁）
             await self.session.commit()
-            await self.session.refresh(group)
 
-        return group
+        return group_id
+
+    async def allocate_game_code(self, group_id: int, game_code_base: int) -> Tuple[int, Optional[int]]:
+        """
+        通过一条UPDATE语句分配对局编号的序号（日期变化时从1开始），不加载GroupOrm（不提交事务）
+        :return: 序号，以及群组当前运行中的赛季ID
+        """
+        # 各赋值均应基于更新前的值，MySQL按顺序求值，因此先更新序号再更新日期
+        stmt = update(GroupOrm).where(GroupOrm.id == group_id).ordered_values(
+            (GroupOrm.prev_game_code_identifier, case(
+                (GroupOrm.prev_game_code_base == game_code_base, GroupOrm.prev_game_code_identifier + 1),
+                else_=1
+            )),
+            (GroupOrm.prev_game_code_base, game_code_base),
+        ).execution_options(synchronize_session=False)
+
+        if self.session.bind.dialect.update_returning:
+            stmt = stmt.returning(GroupOrm.prev_game_code_identifier, GroupOrm.running_season_id)
+            row = (await self.session.execute(stmt)).one()
+        else:
+            # 不支持RETURNING时在同一事务中读回（此时该行已被本事务锁定）
+            await self.session.execute(stmt)
+            stmt = select(GroupOrm.prev_game_code_identifier, GroupOrm.running_season_id).where(
+                GroupOrm.id == group_id
+            )
+            row = (await self.session.execute(stmt)).one()
+
+        return row.prev_game_code_identifier, row.running_season_id
 
 
 __all__ = ("GroupOrm",)
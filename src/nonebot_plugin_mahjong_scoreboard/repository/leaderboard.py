@@ -0,0 +1,157 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Tuple, Optional, NamedTuple, Iterable
+
+from cachetools import LRUCache
+
+from ..config import conf
+
+
+class SeasonLeaderboardEntry(NamedTuple):
+    user_id: int
+    platform_user_id: str
+    point: int
+    rank: int
+
+
+class SeasonLeaderboard:
+    """
+    赛季PT榜单，按PT从高到低有序保存赛季内所有用户的PT
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, str, int]]):
+        """
+        :param rows: (user_id, platform_user_id, point)
+        """
+        self._points: Dict[int, int] = {}
+        self._platform_user_ids: Dict[int, str] = {}
+        for user_id, platform_user_id, point in rows:
+            self._points[user_id] = point
+            self._platform_user_ids[user_id] = platform_user_id
+
+        # 元素为(-point, user_id)，PT相同时按用户ID排序
+        self._keys: List[Tuple[int, int]] = sorted((-point, user_id) for user_id, point in self._points.items())
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._points
+
+    def get(self, user_id: int) -> Optional[SeasonLeaderboardEntry]:
+        """
+        获取用户的PT及位次（PT相同的用户位次相同）
+        """
+        point = self._points.get(user_id)
+        if point is None:
+            return None
+        rank = bisect_left(self._keys, (-point,)) + 1
+        return SeasonLeaderboardEntry(user_id, self._platform_user_ids[user_id], point, rank)
+
+    def top(self, k: Optional[int] = None) -> List[SeasonLeaderboardEntry]:
+        """
+        获取前k名用户（k为None时获取所有用户），位次按顺序编号
+        """
+        keys = self._keys if k is None else self._keys[:k]
+        return [SeasonLeaderboardEntry(user_id, self._platform_user_ids[user_id], -neg_point, i + 1)
+                for i, (neg_point, user_id) in enumerate(keys)]
+
+    def set_point(self, user_id: int, point: int, platform_user_id: Optional[str] = None):
+        old_point = self._points.get(user_id)
+        if old_point is not None:
+            del self._keys[bisect_left(self._keys, (-old_point, user_id))]
+        elif platform_user_id is None:
+            raise KeyError(user_id)
+
+        if platform_user_id is not None:
+            self._platform_user_ids[user_id] = platform_user_id
+        self._points[user_id] = point
+        insort(self._keys, (-point, user_id))
+
+    def remove(self, user_id: int):
+        point = self._points.pop(user_id, None)
+        if point is None:
+            return
+        del self._platform_user_ids[user_id]
+        del self._keys[bisect_left(self._keys, (-point, user_id))]
+
+
+class SeasonLeaderboardCache:
+    """
+    进程内的赛季PT榜单缓存，按LRU策略保留最多maxsize个赛季
+    """
+
+    def __init__(self, maxsize: int):
+        self.enabled = maxsize > 0
+        self._cache = LRUCache[int, SeasonLeaderboard](max(maxsize, 1))
+        # 每次写入PT时自增，用于丢弃加载期间PT发生过变动的榜单
+        self._generation = 0
+        self._writing = 0
+
+    def get(self, season_id: int) -> Optional[SeasonLeaderboard]:
+        if not self.enabled:
+            return None
+        return self._cache.get(season_id)
+
+    def begin_load(self) -> Optional[int]:
+        """
+        开始从数据库加载榜单，若当前有正在进行的写入则返回None（加载的榜单不会被缓存）
+        """
+        if not self.enabled or self._writing > 0:
+            return None
+        return self._generation
+
+    def put(self, season_id: int, leaderboard: SeasonLeaderboard, token: Optional[int]):
+        if token is not None and token == self._generation:
+            self._cache[season_id] = leaderboard
+
+    def begin_write(self):
+        """
+        开始写入赛季PT（直至事务结束），期间加载的榜单不会被缓存。须与end_write成对调用
+        """
+        self._generation += 1
+        self._writing += 1
+
+    def end_write(self):
+        self._writing -= 1
+
+    def invalidate(self, season_id: int):
+        self._cache.pop(season_id, None)
+
+    def add_points(self, season_id: int, points: Dict[int, int], platform_user_ids: Dict[int, str]):
+        """
+        为已缓存的榜单中的用户增加PT，新用户需提供其平台ID，否则令该榜单失效
+        """
+        leaderboard = self._cache.get(season_id)
+        if leaderboard is None:
+            return
+
+        for user_id, point in points.items():
+            if user_id in leaderboard:
+                leaderboard.set_point(user_id, leaderboard.get(user_id).point + point)
+            elif user_id in platform_user_ids:
+                leaderboard.set_point(user_id, point, platform_user_ids[user_id])
+            else:
+                self.invalidate(season_id)
+                return
+
+    def set_points(self, season_id: int, points: Dict[int, Optional[int]], platform_user_ids: Dict[int, str]):
+        """
+        设置已缓存的榜单中用户的PT（None表示移除该用户），新用户需提供其平台ID，否则令该榜单失效
+        """
+        leaderboard = self._cache.get(season_id)
+        if leaderboard is None:
+            return
+
+        for user_id, point in points.items():
+            if point is None:
+                leaderboard.remove(user_id)
+            elif user_id in leaderboard or user_id in platform_user_ids:
+                leaderboard.set_point(user_id, point, platform_user_ids.get(user_id))
+            else:
+                self.invalidate(season_id)
+                return
+
+
+leaderboard_cache = SeasonLeaderboardCache(conf.mahjong_scoreboard_leaderboard_cache_size)
+
+__all__ = ("SeasonLeaderboard", "SeasonLeaderboardEntry", "SeasonLeaderboardCache", "leaderboard_cache")
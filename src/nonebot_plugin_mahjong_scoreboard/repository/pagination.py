@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import TypeVar, List, Generic
+from typing import TypeVar, List, Generic, Optional
 
 T = TypeVar("T")
 
@@ -7,4 +7,5 @@ T = TypeVar("T")
 @dataclass
 class Page(Generic[T]):
     data: List[T]
-    total: int
+    total: Optional[int] = None
+    next_cursor: Optional[int] = None
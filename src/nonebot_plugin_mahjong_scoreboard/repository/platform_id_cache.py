@@ -0,0 +1,48 @@
+import asyncio
+from typing import Dict, Tuple, Optional, Callable, Awaitable
+
+from cachetools import LRUCache
+
+
+class PlatformIdCache:
+    """
+    进程内的平台ID到应用ID的映射缓存（映射一经创建便不会改变），由GroupRepository与UserRepository共用
+    """
+
+    def __init__(self, maxsize: int):
+        self._cache = LRUCache[Tuple[str, str], int](maxsize)
+        # 正在加载（查询或插入）的平台ID，同一平台ID的并发加载只进行一次
+        self._loading: Dict[Tuple[str, str], asyncio.Event] = {}
+
+    async def get(self, kind: str, platform_id: str,
+                  loader: Callable[[], Awaitable[Optional[int]]]) -> Optional[int]:
+        """
+        获取平台ID对应的应用ID，未命中缓存时调用loader加载
+        """
+        key = (kind, platform_id)
+        while True:
+            id_ = self._cache.get(key)
+            if id_ is not None:
+                return id_
+
+            event = self._loading.get(key)
+            if event is None:
+                break
+            # 等待正在进行的加载完成后重新检查缓存（若其未能加载到ID，则由本调用重新加载）
+            await event.wait()
+
+        event = asyncio.Event()
+        self._loading[key] = event
+        try:
+            id_ = await loader()
+            if id_ is not None:
+                self._cache[key] = id_
+            return id_
+        finally:
+            del self._loading[key]
+            event.set()
+
+
+platform_id_cache = PlatformIdCache(8192)
+
+__all__ = ("PlatformIdCache", "platform_id_cache")
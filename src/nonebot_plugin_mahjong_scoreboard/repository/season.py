@@ -1,12 +1,17 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, AsyncIterator, Dict, Callable
 
-from sqlalchemy import update, select, and_, delete, func
+from sqlalchemy import update, select, and_, delete, func, Row
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql.functions import count
 from ssttkkl_nonebot_utils.errors.errors import QueryError
 
+from ._data_source import on_transaction_end
 from .base import Repository
-from .data_model import GameOrm, SeasonOrm, SeasonUserPointOrm, SeasonUserPointChangeLogOrm
+from .data_model import GameOrm, SeasonOrm, SeasonUserPointOrm, SeasonUserPointChangeLogOrm, UserOrm
+from .leaderboard import SeasonLeaderboard, leaderboard_cache
 from ..model import GameState, SeasonUserPointChangeType
 from ..utils.rank import ranked
 
@@ -41,10 +46,9 @@ class SeasonRepository(Repository[SeasonOrm]):
         now = datetime.utcnow()
         stmt = (update(GameOrm)
                 .where(GameOrm.season_id == season_id, GameOrm.state != GameState.completed, GameOrm.accessible)
-                .values(accessible=False, delete_time=now, update_time=now)
+                .values(accessible=False, delete_time=now, update_time=now, version=GameOrm.version + 1)
                 .execution_options(synchronize_session=False))
         result = await self.session.execute(stmt)
-        await self.session.commit()
         return result.rowcount
 
     async def get_season_user_point(self, season_id: int, user_id: int,
@@ -56,22 +60,49 @@ class SeasonRepository(Repository[SeasonOrm]):
         if sup is None and insert_on_missing:
             sup = SeasonUserPointOrm(season_id=season_id, user_id=user_id)
             self.session.add(sup)
-            await self.session.commit()
+            await self.session.flush([sup])
         return sup
 
-    async def get_season_user_point_rank(self, season_id: int, point: int) -> int:
-        stmt = select(count(SeasonUserPointOrm.user_id)).where(
-            SeasonUserPointOrm.season_id == season_id, SeasonUserPointOrm.point > point
-        )
-        result = (await self.session.execute(stmt)).scalar_one_or_none()
-        return result + 1
+    async def get_season_user_point_with_rank(self, season_id: int, user_id: int) -> Optional[Row]:
+        """
+        通过一条语句获取用户的PT、排名、赛季总人数及用户的平台ID
+        """
+        if self.supports_window_functions:
+            ranked_sup = select(
+                SeasonUserPointOrm.user_id,
+                SeasonUserPointOrm.point,
+                func.rank().over(order_by=SeasonUserPointOrm.point.desc()).label("rank"),
+                func.count().over().label("total"),
+            ).where(
+                SeasonUserPointOrm.season_id == season_id
+            ).subquery()
+
+            stmt = select(
+                ranked_sup.c.user_id, UserOrm.platform_user_id, ranked_sup.c.point, ranked_sup.c.rank, ranked_sup.c.total
+            ).join_from(
+                ranked_sup, UserOrm, ranked_sup.c.user_id == UserOrm.id
+            ).where(
+                ranked_sup.c.user_id == user_id
+            )
+        else:
+            higher = aliased(SeasonUserPointOrm)
+            stmt = select(
+                SeasonUserPointOrm.user_id,
+                UserOrm.platform_user_id,
+                SeasonUserPointOrm.point,
+                (select(count(higher.user_id)).where(
+                    higher.season_id == season_id, higher.point > SeasonUserPointOrm.point
+                ).scalar_subquery() + 1).label("rank"),
+                select(count(higher.user_id)).where(
+                    higher.season_id == season_id
+                ).scalar_subquery().label("total"),
+            ).join_from(
+                SeasonUserPointOrm, UserOrm, SeasonUserPointOrm.user_id == UserOrm.id
+            ).where(
+                SeasonUserPointOrm.season_id == season_id, SeasonUserPointOrm.user_id == user_id
+            )
 
-    async def count_season_user_point(self, season_id: int) -> Optional[SeasonUserPointOrm]:
-        stmt = select(count(SeasonUserPointOrm.user_id)).where(
-            SeasonUserPointOrm.season_id == season_id
-        )
-        result = (await self.session.execute(stmt)).scalar_one_or_none()
-        return result
+        return (await self.session.execute(stmt.limit(1))).one_or_none()
 
     async def get_season_user_points(self, season_id: int) -> List[SeasonUserPointOrm]:
         stmt = select(SeasonUserPointOrm).where(
@@ -90,12 +121,36 @@ class SeasonRepository(Repository[SeasonOrm]):
         if user_id is not None:
             stmt = stmt.where(SeasonUserPointChangeLogOrm.user_id == user_id)
 
-        stmt.order_by(SeasonUserPointChangeLogOrm.create_time)
+        stmt = stmt.order_by(SeasonUserPointChangeLogOrm.create_time, SeasonUserPointChangeLogOrm.id)
 
         result = (await self.session.execute(stmt)).all()
         data = [row[0] for row in result]
         return data
 
+    async def stream_season_user_point_change_log_rows(self, season_id: int) -> AsyncIterator[Row]:
+        """
+        按时间顺序流式返回赛季的PT变动记录，每行仅包含用户、变动及关联对局的ID与编号
+        """
+        stmt = select(
+            SeasonUserPointChangeLogOrm.user_id,
+            UserOrm.platform_user_id,
+            SeasonUserPointChangeLogOrm.change_type,
+            SeasonUserPointChangeLogOrm.change_point,
+            SeasonUserPointChangeLogOrm.related_game_id,
+            GameOrm.code.label("related_game_code"),
+            SeasonUserPointChangeLogOrm.create_time,
+        ).join_from(
+            SeasonUserPointChangeLogOrm, UserOrm, SeasonUserPointChangeLogOrm.user_id == UserOrm.id
+        ).outerjoin(
+            GameOrm, SeasonUserPointChangeLogOrm.related_game_id == GameOrm.id
+        ).where(
+            SeasonUserPointChangeLogOrm.season_id == season_id
+        ).order_by(SeasonUserPointChangeLogOrm.create_time, SeasonUserPointChangeLogOrm.id)
+
+        result = await self.session.stream(stmt)
+        async for row in result:
+            yield row
+
     async def change_season_user_point_manually(self, season_id: int,
                                                 user_id: int,
                                                 point: float) -> SeasonUserPointOrm:
@@ -109,13 +164,83 @@ class SeasonRepository(Repository[SeasonOrm]):
                                           change_type=SeasonUserPointChangeType.manually,
                                           change_point=point)
         self.session.add(log)
+        await self.session.flush([log])
 
+        sup.last_change_log_id = log.id
+        sup.change_count += 1
         sup.update_time = datetime.utcnow()
-        await self.session.commit()
+
+        platform_user_ids = self._get_loaded_platform_user_ids([user_id])
+        self._update_leaderboard_on_commit(
+            season_id, lambda: leaderboard_cache.set_points(season_id, {user_id: point}, platform_user_ids)
+        )
 
         return sup
 
     async def change_season_user_point_by_game(self, game: GameOrm):
+        if self.dialect == 'sqlite':
+            insert = sqlite.insert
+        elif self.dialect == 'postgresql':
+            insert = postgresql.insert
+        else:
+            insert = None
+
+        if insert is not None and self.session.bind.dialect.insert_returning:
+            await self._change_season_user_point_by_game_upsert(game, insert)
+        else:
+            await self._change_season_user_point_by_game_one_by_one(game)
+
+        season_id = game.season_id
+        points = {r.user_id: r.raw_point for r in game.records}
+        platform_user_ids = self._get_loaded_platform_user_ids(list(points.keys()))
+        self._update_leaderboard_on_commit(
+            season_id, lambda: leaderboard_cache.add_points(season_id, points, platform_user_ids)
+        )
+
+    async def _change_season_user_point_by_game_upsert(self, game: GameOrm, insert):
+        now = datetime.utcnow()
+        records = [r for rank, r in ranked(game.records, key=lambda r: r.raw_point, reverse=True)]
+
+        # 记录SeasonUserPointChangeLog（一条多行INSERT语句）
+        stmt = insert(SeasonUserPointChangeLogOrm).values([
+            dict(user_id=r.user_id,
+                 season_id=game.season_id,
+                 change_type=SeasonUserPointChangeType.game,
+                 change_point=r.raw_point,
+                 related_game_id=game.id,
+                 create_time=now)
+            for r in records
+        ]).returning(SeasonUserPointChangeLogOrm.user_id, SeasonUserPointChangeLogOrm.id)
+        change_log_ids = dict((await self.session.execute(stmt)).all())
+
+        # 记录SeasonUserPoint（一条UPSERT语句）
+        stmt = insert(SeasonUserPointOrm).values([
+            dict(season_id=game.season_id, user_id=r.user_id, point=r.raw_point,
+                 last_change_log_id=change_log_ids[r.user_id], change_count=1,
+                 create_time=now, update_time=now)
+            for r in records
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SeasonUserPointOrm.season_id, SeasonUserPointOrm.user_id],
+            set_=dict(point=SeasonUserPointOrm.point + stmt.excluded.point,
+                      last_change_log_id=stmt.excluded.last_change_log_id,
+                      change_count=SeasonUserPointOrm.change_count + 1,
+                      update_time=stmt.excluded.update_time)
+        )
+        await self.session.execute(stmt)
+
+        # 同步session中已加载的SeasonUserPoint
+        for r in records:
+            user_point = self.session.identity_map.get(
+                self.session.identity_key(SeasonUserPointOrm, (game.season_id, r.user_id))
+            )
+            if user_point is not None:
+                set_committed_value(user_point, "point", user_point.point + r.raw_point)
+                set_committed_value(user_point, "last_change_log_id", change_log_ids[r.user_id])
+                set_committed_value(user_point, "change_count", user_point.change_count + 1)
+                set_committed_value(user_point, "update_time", now)
+
+    async def _change_season_user_point_by_game_one_by_one(self, game: GameOrm):
         for rank, r in ranked(game.records, key=lambda r: r.raw_point, reverse=True):
             # 记录SeasonUserPoint
             stmt = select(SeasonUserPointOrm).where(
@@ -127,11 +252,10 @@ class SeasonRepository(Repository[SeasonOrm]):
             if user_point is None:
                 user_point = SeasonUserPointOrm(season_id=game.season_id,
                                                 user_id=r.user_id,
-                                                point=0)
+                                                point=0,
+                                                change_count=0)
                 self.session.add(user_point)
 
-            user_point.point += r.raw_point
-
             # 记录SeasonUserPointChangeLog
             change_log = SeasonUserPointChangeLogOrm(user_id=r.user_id,
                                                      season_id=game.season_id,
@@ -139,8 +263,13 @@ class SeasonRepository(Repository[SeasonOrm]):
                                                      change_point=r.raw_point,
                                                      related_game_id=game.id)
             self.session.add(change_log)
+            await self.session.flush([change_log])
+
+            user_point.point += r.raw_point
+            user_point.last_change_log_id = change_log.id
+            user_point.change_count += 1
 
-        await self.session.commit()
+        await self.session.flush()
 
     async def revert_season_user_point_by_game(self, game: GameOrm):
         stmt = select(SeasonUserPointChangeLogOrm, SeasonUserPointOrm).join_from(
@@ -150,34 +279,78 @@ class SeasonRepository(Repository[SeasonOrm]):
             )
         ).where(
             SeasonUserPointChangeLogOrm.related_game_id == game.id
-        )
-
-        for change_log, user_point in await self.session.execute(stmt):
-            # 判断在此之后是否还变动过PT
-            stmt = select(func.count(SeasonUserPointChangeLogOrm.id)).where(
-                SeasonUserPointChangeLogOrm.season_id == change_log.season_id,
-                SeasonUserPointChangeLogOrm.user_id == change_log.user_id,
-                SeasonUserPointChangeLogOrm.id > change_log.id
-            )
-            cnt = (await self.session.execute(stmt)).scalar_one()
+        ).execution_options(populate_existing=True)
+        rows = (await self.session.execute(stmt)).all()
+        if len(rows) == 0:
+            return
 
-            if cnt != 0:
+        # 判断在此之后是否还变动过PT
+        for change_log, user_point in rows:
+            if user_point.last_change_log_id != change_log.id:
                 raise QueryError("撤销结算失败，在该对局之后该用户PT发生了改变")
 
-            user_point.point -= change_log.change_point
-            await self.session.delete(change_log)
-
-            # 若用户只有这一次PT变动，则删除PT记录
-            stmt = select(func.count(SeasonUserPointChangeLogOrm.id)).where(
-                SeasonUserPointChangeLogOrm.season_id == user_point.season_id,
-                SeasonUserPointChangeLogOrm.user_id == user_point.user_id,
-            )
-            cnt = (await self.session.execute(stmt)).scalar_one()
+        season_id = rows[0][0].season_id
+        reverted_points = {user_point.user_id: -change_log.change_point
+                           for change_log, user_point in rows if user_point.change_count > 1}
+        removed_points = {user_point.user_id: None
+                          for change_log, user_point in rows if user_point.change_count <= 1}
+
+        await self._revert_season_user_point(game, rows)
+
+        def update_leaderboard():
+            leaderboard_cache.add_points(season_id, reverted_points, {})
+            leaderboard_cache.set_points(season_id, removed_points, {})
+
+        self._update_leaderboard_on_commit(season_id, update_leaderboard)
+
+    async def _revert_season_user_point(self, game: GameOrm, rows: List[Row]):
+        season_id = rows[0][0].season_id
+
+        # 若用户只有这一次PT变动，则删除PT记录
+        removed_user_ids = [user_point.user_id for change_log, user_point in rows if user_point.change_count <= 1]
+        if len(removed_user_ids) > 0:
+            stmt = delete(SeasonUserPointOrm).where(
+                SeasonUserPointOrm.season_id == season_id,
+                SeasonUserPointOrm.user_id.in_(removed_user_ids)
+            ).execution_options(synchronize_session=False)
+            await self.session.execute(stmt)
+
+        # 否则回退PT，并指向上一次PT变动记录（撤销结算恢复此前的状态，不更新update_time）
+        reverted_user_ids = [user_point.user_id for change_log, user_point in rows if user_point.change_count > 1]
+        if len(reverted_user_ids) > 0:
+            change_point = select(SeasonUserPointChangeLogOrm.change_point).where(
+                SeasonUserPointChangeLogOrm.id == SeasonUserPointOrm.last_change_log_id
+            ).scalar_subquery()
+            prev_change_log_id = select(func.max(SeasonUserPointChangeLogOrm.id)).where(
+                SeasonUserPointChangeLogOrm.season_id == SeasonUserPointOrm.season_id,
+                SeasonUserPointChangeLogOrm.user_id == SeasonUserPointOrm.user_id,
+                SeasonUserPointChangeLogOrm.id < SeasonUserPointOrm.last_change_log_id
+            ).scalar_subquery()
+            stmt = update(SeasonUserPointOrm).where(
+                SeasonUserPointOrm.season_id == season_id,
+                SeasonUserPointOrm.user_id.in_(reverted_user_ids)
+            ).values(
+                point=SeasonUserPointOrm.point - change_point,
+                last_change_log_id=prev_change_log_id,
+                change_count=SeasonUserPointOrm.change_count - 1
+            ).execution_options(synchronize_session=False)
+            await self.session.execute(stmt)
 
-            if cnt == 0:
-                await self.session.delete(user_point)
+        stmt = delete(SeasonUserPointChangeLogOrm).where(
+            SeasonUserPointChangeLogOrm.related_game_id == game.id
+        ).execution_options(synchronize_session=False)
+        await self.session.execute(stmt)
 
-        await self.session.commit()
+        # 同步session中已加载的对象
+        for change_log, user_point in rows:
+            self.session.expunge(change_log)
+            if user_point.change_count <= 1:
+                self.session.expunge(user_point)
+            else:
+                set_committed_value(user_point, "point", user_point.point - change_log.change_point)
+                set_committed_value(user_point, "change_count", user_point.change_count - 1)
+                # 上一次PT变动记录的ID需要查询才能得知，此处令其过期
+                self.session.expire(user_point, ["last_change_log_id"])
 
     async def reset_season_user_point(self, season_id: int, user_id: int):
         sup = await self.get_season_user_point(season_id, user_id)
@@ -191,7 +364,69 @@ class SeasonRepository(Repository[SeasonOrm]):
         await self.session.execute(stmt)
 
         await self.session.delete(sup)
-        await self.session.commit()
+        await self.session.flush([sup])
+
+        self._update_leaderboard_on_commit(
+            season_id, lambda: leaderboard_cache.set_points(season_id, {user_id: None}, {})
+        )
+
+    async def get_leaderboard(self, season_id: int) -> Optional[SeasonLeaderboard]:
+        """
+        获取赛季PT榜单，优先使用进程内缓存；未启用缓存时返回None
+        """
+        if not leaderboard_cache.enabled:
+            return None
+
+        leaderboard = leaderboard_cache.get(season_id)
+        if leaderboard is None:
+            token = leaderboard_cache.begin_load()
+            stmt = select(
+                SeasonUserPointOrm.user_id, UserOrm.platform_user_id, SeasonUserPointOrm.point
+            ).join_from(
+                SeasonUserPointOrm, UserOrm, SeasonUserPointOrm.user_id == UserOrm.id
+            ).where(
+                SeasonUserPointOrm.season_id == season_id
+            )
+            if token is None:
+                # 不会被缓存，使用调用方的session（可读取到其未提交的修改）
+                rows = (await self.session.execute(stmt)).all()
+            else:
+                # 调用方的session可能仍处于较早开始的读事务中（读取到的是旧快照），
+                # 因此在新的连接中读取已提交的最新数据，之后才能放入缓存
+                async with self.session.bind.connect() as conn:
+                    rows = (await conn.execute(stmt)).all()
+            leaderboard = SeasonLeaderboard(rows)
+            leaderboard_cache.put(season_id, leaderboard, token)
+        return leaderboard
+
+    def _update_leaderboard_on_commit(self, season_id: int, update: Callable[[], None]):
+        """
+        在事务提交后更新已缓存的榜单（提交前加载的榜单不会被缓存），若事务回滚则令该赛季的榜单失效
+        """
+        leaderboard_cache.begin_write()
+
+        def on_commit():
+            try:
+                update()
+            finally:
+                leaderboard_cache.end_write()
+
+        def on_rollback():
+            leaderboard_cache.invalidate(season_id)
+            leaderboard_cache.end_write()
+
+        on_transaction_end(self.session, on_commit, on_rollback)
+
+    def _get_loaded_platform_user_ids(self, user_ids: List[int]) -> Dict[int, str]:
+        """
+        从session中已加载的用户获取平台ID（不查询数据库）
+        """
+        result = {}
+        for user_id in user_ids:
+            user = self.session.identity_map.get(self.session.identity_key(UserOrm, user_id))
+            if user is not None and "platform_user_id" in user.__dict__:
+                result[user_id] = user.platform_user_id
+        return result
 
 
 __all__ = ("SeasonOrm", "SeasonUserPointOrm", "SeasonUserPointChangeLogOrm")
@@ -0,0 +1,190 @@
+from typing import Optional, Dict, Any, List, Tuple, Collection
+
+from sqlalchemy import select, delete, text, func, case, Select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from ._data_source.migrate import complete_online_migration
+from ._data_source.migrations.v6_to_v7 import user_game_stats_migration
+from .base import Repository
+from .data_model import UserGameStatsOrm, GameOrm, GameRecordOrm
+from ..model import GameState, PlayerAndWind
+
+# UserGameStatsOrm.season_id为该值时统计群组内所有对局
+ALL_SEASONS = 0
+
+_COUNTER_COLUMNS = ("total", "total_east", "total_south", "rank_1", "rank_2", "rank_3", "rank_4",
+                    "sum_point", "flying")
+
+
+def _record_stats(player_and_wind: PlayerAndWind, rank: Optional[int], score: int, point: float,
+                  sign: int = 1) -> Dict[str, Any]:
+    return dict(total=sign,
+                total_east=sign if player_and_wind == PlayerAndWind.four_men_east else 0,
+                total_south=sign if player_and_wind == PlayerAndWind.four_men_south else 0,
+                rank_1=sign if rank == 1 else 0,
+                rank_2=sign if rank == 2 else 0,
+                rank_3=sign if rank == 3 else 0,
+                rank_4=sign if rank == 4 else 0,
+                sum_point=point * sign,
+                flying=sign if score < 0 else 0)
+
+
+def _stats_season_ids(season_id: Optional[int]) -> List[int]:
+    if season_id:
+        return [ALL_SEASONS, season_id]
+    else:
+        return [ALL_SEASONS]
+
+
+class UserGameStatsRepository(Repository[UserGameStatsOrm]):
+    Entity = UserGameStatsOrm
+
+    async def get(self, group_id: int, user_id: int, season_id: int = ALL_SEASONS) -> Optional[UserGameStatsOrm]:
+        stmt = select(UserGameStatsOrm).where(
+            UserGameStatsOrm.group_id == group_id,
+            UserGameStatsOrm.season_id == season_id,
+            UserGameStatsOrm.user_id == user_id
+        ).limit(1).execution_options(populate_existing=True)
+        return (await self.session.execute(stmt)).scalar_one_or_none()
+
+    async def add_game(self, game: GameOrm):
+        """
+        将已完成的对局计入对战数据（不提交事务）
+        """
+        await self._apply_game(game, 1)
+
+    async def remove_game(self, game: GameOrm):
+        """
+        从对战数据中减去已完成的对局（不提交事务）
+        """
+        await self._apply_game(game, -1)
+
+    async def _apply_game(self, game: GameOrm, sign: int):
+        if not user_game_stats_migration.is_group_migrated(game.group_id):
+            # 该群组的对战数据尚未计算（后台迁移失败，下次启动时继续），此时查询直接从对局记录中统计
+            return
+
+        values = [
+            dict(group_id=game.group_id, season_id=season_id, user_id=r.user_id,
+                 **_record_stats(game.player_and_wind, r.rank, r.score, r.point, sign))
+            for season_id in _stats_season_ids(game.season_id)
+            for r in game.records
+        ]
+
+        if self.dialect == 'sqlite':
+            insert = sqlite.insert
+        elif self.dialect == 'postgresql':
+            insert = postgresql.insert
+        else:
+            await self._apply_game_one_by_one(values)
+            return
+
+        stmt = insert(UserGameStatsOrm).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserGameStatsOrm.group_id, UserGameStatsOrm.season_id, UserGameStatsOrm.user_id],
+            set_={col: getattr(UserGameStatsOrm, col) + getattr(stmt.excluded, col) for col in _COUNTER_COLUMNS}
+        )
+        await self.session.execute(stmt)
+
+    async def _apply_game_one_by_one(self, values: List[Dict[str, Any]]):
+        for v in values:
+            stats = await self.session.get(UserGameStatsOrm, (v["group_id"], v["season_id"], v["user_id"]))
+            if stats is None:
+                self.session.add(UserGameStatsOrm(**v))
+            else:
+                for col in _COUNTER_COLUMNS:
+                    setattr(stats, col, getattr(stats, col) + v[col])
+        await self.session.flush()
+
+    @staticmethod
+    def _build_aggregate_query(*keys) -> Select:
+        # 各对局的point_scale可能不同，因此按point_scale分别求raw_point之和，在Python中合并
+        return select(
+            *keys,
+            GameRecordOrm.point_scale,
+            func.count().label("total"),
+            func.sum(case((GameOrm.player_and_wind == PlayerAndWind.four_men_east, 1), else_=0)).label("total_east"),
+            func.sum(case((GameOrm.player_and_wind == PlayerAndWind.four_men_south, 1), else_=0)).label("total_south"),
+            func.sum(case((GameRecordOrm.rank == 1, 1), else_=0)).label("rank_1"),
+            func.sum(case((GameRecordOrm.rank == 2, 1), else_=0)).label("rank_2"),
+            func.sum(case((GameRecordOrm.rank == 3, 1), else_=0)).label("rank_3"),
+            func.sum(case((GameRecordOrm.rank == 4, 1), else_=0)).label("rank_4"),
+            func.sum(GameRecordOrm.raw_point).label("sum_raw_point"),
+            func.sum(case((GameRecordOrm.score < 0, 1), else_=0)).label("flying"),
+        ).join_from(
+            GameOrm, GameRecordOrm, GameOrm.id == GameRecordOrm.game_id
+        ).where(
+            GameOrm.state == GameState.completed,
+            GameOrm.accessible
+        ).group_by(*keys, GameRecordOrm.point_scale)
+
+    @staticmethod
+    def _fold_aggregate_rows(rows, season_id: Optional[int] = None) -> Dict[Tuple[int, int, int], UserGameStatsOrm]:
+        result = {}
+        for row in rows:
+            key = (row.group_id, season_id if season_id is not None else row.season_id, row.user_id)
+            stats = result.get(key)
+            if stats is None:
+                stats = UserGameStatsOrm(group_id=key[0], season_id=key[1], user_id=key[2],
+                                         **{col: 0 for col in _COUNTER_COLUMNS})
+                result[key] = stats
+
+            for col in _COUNTER_COLUMNS:
+                if col != "sum_point":
+                    setattr(stats, col, getattr(stats, col) + getattr(row, col))
+            stats.sum_point += row.sum_raw_point * (10 ** row.point_scale)
+        return result
+
+    async def aggregate(self, group_id: int, user_id: int,
+                        season_id: int = ALL_SEASONS) -> Optional[UserGameStatsOrm]:
+        """
+        直接从对局记录中统计用户的对战数据（通过一条分组查询，返回的对象不加入session）
+        """
+        stmt = self._build_aggregate_query(
+            GameOrm.group_id, GameRecordOrm.user_id
+        ).where(
+            GameOrm.group_id == group_id,
+            GameRecordOrm.user_id == user_id
+        )
+        if season_id != ALL_SEASONS:
+            stmt = stmt.where(GameOrm.season_id == season_id)
+
+        result = self._fold_aggregate_rows((await self.session.execute(stmt)).all(), season_id)
+        return result.get((group_id, season_id, user_id))
+
+    async def rebuild(self, group_ids: Optional[Collection[int]] = None) -> int:
+        """
+        根据所有已完成的对局重新计算对战数据，返回对战数据的行数
+        :param group_ids: 只重新计算这些群组的对战数据，为None时重新计算所有群组
+        """
+        if self.dialect == 'postgresql' and group_ids is None:
+            # 阻塞重建期间的结算，避免其增量丢失
+            await self.session.execute(text("LOCK TABLE user_game_stats IN EXCLUSIVE MODE"))
+
+        stmt = delete(UserGameStatsOrm)
+        if group_ids is not None:
+            stmt = stmt.where(UserGameStatsOrm.group_id.in_(group_ids))
+        await self.session.execute(stmt)
+
+        stmt = self._build_aggregate_query(GameOrm.group_id, GameRecordOrm.user_id)
+        if group_ids is not None:
+            stmt = stmt.where(GameOrm.group_id.in_(group_ids))
+        stats = self._fold_aggregate_rows((await self.session.execute(stmt)).all(), ALL_SEASONS)
+
+        stmt = self._build_aggregate_query(
+            GameOrm.group_id, GameOrm.season_id, GameRecordOrm.user_id
+        ).where(GameOrm.season_id.is_not(None))
+        if group_ids is not None:
+            stmt = stmt.where(GameOrm.group_id.in_(group_ids))
+        stats.update(self._fold_aggregate_rows((await self.session.execute(stmt)).all()))
+
+        self.session.add_all(stats.values())
+        await self.session.flush()
+
+        if group_ids is None:
+            # 已重新计算所有群组，未完成的对战数据迁移无需再继续
+            await complete_online_migration(self.session, user_game_stats_migration)
+        return len(stats)
+
+
+__all__ = ("UserGameStatsRepository", "UserGameStatsOrm", "ALL_SEASONS")
@@ -1,5 +1,7 @@
+import json
 from typing import Type
 
+from cachetools import LRUCache
 from pydantic import BaseModel
 from sqlalchemy import TypeDecorator, JSON
 
@@ -8,12 +10,43 @@ class PydanticModel(TypeDecorator):
     impl = JSON
     cache_ok = True
 
-    def __init__(self, t_model: Type[BaseModel], *args, **kwargs):
+    def __init__(self, t_model: Type[BaseModel], *args, cache_size: int = 0, **kwargs):
+        """
+        :param cache_size: 按JSON内容缓存解析结果的数量，仅适用于不可变的模型（相同内容的行共享同一实例）
+        """
         super().__init__(*args, **kwargs)
         self.t_model = t_model
+        self.cache_size = cache_size
+        self._cache = LRUCache(cache_size) if cache_size > 0 else None
 
     def process_bind_param(self, value, dialect):
         return value.dict()
 
     def process_result_value(self, value, dialect):
-        return self.t_model.parse_obj(value)
+        if value is None or self._cache is None:
+            return self.t_model.parse_obj(value)
+
+        key = json.dumps(value, sort_keys=True)
+        model = self._cache.get(key)
+        if model is None:
+            model = self.t_model.parse_obj(value)
+            self._cache[key] = model
+        return model
+
+    def result_processor(self, dialect, coltype):
+        process_value = super().result_processor(dialect, coltype)
+        if self._cache is None:
+            return process_value
+
+        def process(value):
+            # 驱动返回JSON文本时（如sqlite），以文本为键，命中时省去反序列化及校验
+            if not isinstance(value, str):
+                return process_value(value)
+
+            model = self._cache.get(value)
+            if model is None:
+                model = process_value(value)
+                self._cache[value] = model
+            return model
+
+        return process
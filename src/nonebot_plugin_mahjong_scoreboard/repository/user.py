@@ -1,23 +1,45 @@
+from typing import Optional
+
 from sqlalchemy import select
 
+from ._data_source import begin_write
 from .base import Repository
 from .data_model import UserOrm
+from .platform_id_cache import platform_id_cache
 
 
 class UserRepository(Repository[UserOrm]):
     Entity = UserOrm
 
-    async def get(self, platform_user_id: str, *, insert_on_missing: bool = True) -> UserOrm:
-        stmt = select(UserOrm).where(UserOrm.platform_user_id == platform_user_id).limit(1)
-        result = await self.session.execute(stmt)
-        user = result.scalar_one_or_none()
-        if user is None and insert_on_missing:
-            user = UserOrm(platform_user_id=platform_user_id)
-            self.session.add(user)
+    async def get(self, platform_user_id: str, *, insert_on_missing: bool = True) -> Optional[UserOrm]:
+        user_id = await self.get_id(platform_user_id, insert_on_missing=insert_on_missing)
+        if user_id is None:
+            return None
+        return await self.get_by_pk(user_id)
+
+    async def get_id(self, platform_user_id: str, *, insert_on_missing: bool = True) -> Optional[int]:
+        """
+        获取平台用户ID对应的用户ID（命中缓存时不查询数据库）
+        """
+        return await platform_id_cache.get("user", platform_user_id,
+                                           lambda: self._load_id(platform_user_id, insert_on_missing))
+
+    async def _load_id(self, platform_user_id: str, insert_on_missing: bool) -> Optional[int]:
+        stmt = select(UserOrm.id).where(UserOrm.platform_user_id == platform_user_id).limit(1)
+        user_id = (await self.session.execute(stmt)).scalar_one_or_none()
+        if user_id is None and insert_on_missing:
+            # 先取得写锁再插入（避免读事务升级为写事务时失败），并重新查询，期间可能已被其他连接插入
+            await begin_write(self.session)
+            user_id = (await self.session.execute(stmt)).scalar_one_or_none()
+            if user_id is None:
+                user = UserOrm(platform_user_id=platform_user_id)
+                self.session.add(user)
+                await self.session.flush()
+                user_id = user.id
+            # 新建的ID会进入缓存并被其他session使用，因此须立即提交（同时释放写锁）
             await self.session.commit()
-            await self.session.refresh(user)
 
-        return user
+        return user_id
 
 
 __all__ = ("UserOrm",)
@@ -1,34 +1,73 @@
 from datetime import datetime, timedelta
+from functools import wraps
 from math import ceil
-from typing import List, Optional, Tuple, overload
+from typing import List, Optional, Tuple, overload, AsyncIterator
 
 import tzlocal
 from nonebot import logger
 from nonebot_plugin_apscheduler import scheduler
 from sqlalchemy import delete
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
 from ssttkkl_nonebot_utils.errors.errors import QueryError
 
 from .group_service import is_group_admin
-from .mapper import map_game
+from .lock import group_lock
+from .mapper import map_game, map_games
 from ..model import Game, GameStatistics, GameState, PlayerAndWind, Wind, SeasonState, RankPointPolicy
-from ..repository import data_source
-from ..repository.data_model import GroupOrm, GameOrm, GameRecordOrm, GameProgressOrm, SeasonOrm
-from ..repository.game import GameRepository
+from ..repository import data_source, write_transaction, is_migrating
+from ..repository.data_model import GameOrm, GameRecordOrm, GameProgressOrm
+from ..repository.game import GameRepository, GameLoadPlan
+from ..repository.group import GroupRepository
 from ..repository.pagination import Page
 from ..repository.season import SeasonRepository
+from ..repository.statistics import UserGameStatsRepository, UserGameStatsOrm, ALL_SEASONS
 from ..utils.date import encode_date
 from ..utils.integer import count_digit
 
 
 @scheduler.scheduled_job("cron", hour="*/2", id="delete_all_uncompleted_game")
 async def _delete_all_uncompleted_game():
-    async with AsyncSession(data_source.engine) as session:
+    if is_migrating():
+        return
+    async with AsyncSession(data_source.engine) as session, write_transaction(session):
         repo = GameRepository(session)
         rowcount = await repo.delete_all_uncompleted_game()
         logger.success(f"deleted {rowcount} outdated uncompleted game(s)")
 
 
+@scheduler.scheduled_job("cron", hour=4, id="rebuild_user_game_stats")
+async def _rebuild_user_game_stats():
+    if is_migrating():
+        return
+    async with AsyncSession(data_source.engine) as session, write_transaction(session):
+        repo = UserGameStatsRepository(session)
+        rowcount = await repo.rebuild()
+        logger.success(f"rebuilt {rowcount} user game stats")
+
+
+# 对局被其他操作并发修改时（版本号不一致）重新读取并重试的最大次数
+GAME_UPDATE_MAX_ATTEMPTS = 3
+
+
+def _retry_on_conflict(func):
+    """
+    提交时若对局已被其他操作修改，则回滚并重新执行（重新读取对局）
+    """
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        for i in range(GAME_UPDATE_MAX_ATTEMPTS):
+            try:
+                return await func(*args, **kwargs)
+            except StaleDataError:
+                logger.debug(f"game was modified concurrently during {func.__name__}, retry ({i + 1})")
+        raise QueryError("对局正在被其他操作修改，请稍后重试")
+
+    return wrapper
+
+
 async def _ensure_updatable(game: GameOrm):
     session = data_source.session()
     repo = SeasonRepository(session)
@@ -39,14 +78,48 @@ async def _ensure_updatable(game: GameOrm):
             raise QueryError("赛季已经结束，无法再修改对局")
 
 
+def _requires_admin(game: GameOrm) -> bool:
+    return game.state == GameState.completed and datetime.utcnow() - game.complete_time >= timedelta(days=1)
+
+
 async def _ensure_permission(game: GameOrm, group_id: int, operator_user_id: int):
-    if game.state == GameState.completed:
-        completed_before_24h = datetime.utcnow() - game.complete_time >= timedelta(days=1)
+    if not _requires_admin(game) or await is_group_admin(operator_user_id, group_id):
+        return
+
+    raise QueryError("对局已完成超过24小时，需要管理员权限才能操作")
+
+
+async def _check_before_write(game_code: int, group_id: int, operator_user_id: int,
+                              *, admin_only: bool = False) -> int:
+    """
+    在开启写事务之前检查对局及操作权限（可能需要调用平台API，不能在持有数据库写锁时进行），
+    返回检查时对局的版本号，写事务中须通过_ensure_still_permitted确认权限仍然有效
+    """
+    session = data_source.session()
+    game_repo = GameRepository(session)
 
-        if not completed_before_24h or await is_group_admin(operator_user_id, group_id):
-            return
+    game = await game_repo.get_by_code(game_code, group_id, load=GameLoadPlan.bare)
+    if game is None:
+        raise QueryError("未找到指定对局")
+
+    await _ensure_updatable(game)
+    if admin_only:
+        if not await is_group_admin(operator_user_id, group_id):
+            raise QueryError("需要管理员权限进行该操作")
+    else:
+        await _ensure_permission(game, group_id, operator_user_id)
 
-        raise QueryError("对局已完成超过24小时，需要管理员权限才能操作")
+    # 结束读事务，避免等待群组锁期间仍占用连接
+    await session.commit()
+    return game.version
+
+
+def _ensure_still_permitted(game: Optional[GameOrm], version: int):
+    if game is None:
+        raise QueryError("未找到指定对局")
+    if game.version != version and _requires_admin(game):
+        # 检查权限之后对局被其他操作修改为需要管理员权限的状态，由_retry_on_conflict重新检查并执行
+        raise StaleDataError()
 
 
 async def new_game(promoter_user_id: int,
@@ -54,49 +127,45 @@ async def new_game(promoter_user_id: int,
                    player_and_wind: Optional[PlayerAndWind]) -> Game:
     session = data_source.session()
 
+    group_repo = GroupRepository(session)
     season_repo = SeasonRepository(session)
 
-    group = await session.get(GroupOrm, group_id)
-
-    # game_code
-    now = datetime.now(tzlocal.get_localzone())
-    game_code_base = encode_date(now)
-    if game_code_base != group.prev_game_code_base:
-        group.prev_game_code_base = game_code_base
-        group.prev_game_code_identifier = 0
-
-    group.prev_game_code_identifier += 1
-
-    digit = max(2, count_digit(group.prev_game_code_identifier))
-    game_code = group.prev_game_code_base * (10 ** digit) + group.prev_game_code_identifier
-
-    # 未指定player_and_wind时，若赛季启用了半庄则默认为半庄，否则为东风
-    if player_and_wind is None:
-        if group.running_season_id is not None:
-            season = await season_repo.get_by_pk(group.running_season_id)
-            if season.config.south_game_enabled:
-                player_and_wind = PlayerAndWind.four_men_south
+    # 分配编号的UPDATE会锁定群组行直至提交，因此无需再获取群组锁
+    async with write_transaction(session):
+        # game_code
+        now = datetime.now(tzlocal.get_localzone())
+        game_code_base = encode_date(now)
+        game_code_identifier, running_season_id = await group_repo.allocate_game_code(group_id, game_code_base)
+
+        digit = max(2, count_digit(game_code_identifier))
+        game_code = game_code_base * (10 ** digit) + game_code_identifier
+
+        # 未指定player_and_wind时，若赛季启用了半庄则默认为半庄，否则为东风
+        if player_and_wind is None:
+            if running_season_id is not None:
+                season = await season_repo.get_by_pk(running_season_id)
+                if season.config.south_game_enabled:
+                    player_and_wind = PlayerAndWind.four_men_south
+                else:
+                    player_and_wind = PlayerAndWind.four_men_east
             else:
-                player_and_wind = PlayerAndWind.four_men_east
+                player_and_wind = PlayerAndWind.four_men_south
         else:
-            player_and_wind = PlayerAndWind.four_men_south
-    else:
-        if group.running_season_id is not None:
-            season = await season_repo.get_by_pk(group.running_season_id)
-            if player_and_wind == PlayerAndWind.four_men_south and not season.config.south_game_enabled \
-                    or player_and_wind == PlayerAndWind.four_men_east and not season.config.east_game_enabled:
-                raise QueryError("当前赛季未开放此类型对局")
-
-    game = GameOrm(code=game_code,
-                   group_id=group_id,
-                   promoter_user_id=promoter_user_id,
-                   player_and_wind=player_and_wind,
-                   season_id=group.running_season_id,
-                   records=[])
-
-    session.add(game)
-    await session.commit()
-    await session.refresh(game)
+            if running_season_id is not None:
+                season = await season_repo.get_by_pk(running_season_id)
+                if player_and_wind == PlayerAndWind.four_men_south and not season.config.south_game_enabled \
+                        or player_and_wind == PlayerAndWind.four_men_east and not season.config.east_game_enabled:
+                    raise QueryError("当前赛季未开放此类型对局")
+
+        game = GameOrm(code=game_code,
+                       group_id=group_id,
+                       promoter_user_id=promoter_user_id,
+                       player_and_wind=player_and_wind,
+                       season_id=running_season_id,
+                       records=[],
+                       progress=None)
+
+        session.add(game)
 
     return await map_game(game, session)
 
@@ -108,6 +177,7 @@ async def get_game(game_code: int, group_id: int) -> Game:
     return await map_game(game, session)
 
 
+@_retry_on_conflict
 async def record_game(game_code: int,
                       group_id: int,
                       user_id: int,
@@ -117,39 +187,38 @@ async def record_game(game_code: int,
     session = data_source.session()
 
     game_repo = GameRepository(session)
-    season_repo = SeasonRepository(session)
 
-    game = await game_repo.get_by_code(game_code, group_id)
-    if game is None:
-        raise QueryError("未找到指定对局")
+    version = await _check_before_write(game_code, group_id, operator_user_id)
 
-    await _ensure_updatable(game)
-    await _ensure_permission(game, group_id, operator_user_id)
+    async with group_lock(group_id), write_transaction(session):
+        game = await game_repo.get_by_code(game_code, group_id)
+        _ensure_still_permitted(game, version)
+        await _ensure_updatable(game)
 
-    for r in game.records:
-        if r.user_id == user_id:
-            record = r
-            break
-    else:
-        if len(game.records) == 4:
-            raise QueryError("这场对局已经存在4人记录")
+        for r in game.records:
+            if r.user_id == user_id:
+                record = r
+                break
+        else:
+            if len(game.records) == 4:
+                raise QueryError("这场对局已经存在4人记录")
 
-        record = GameRecordOrm(game_id=game.id, user_id=user_id)
-        session.add(record)
-        game.records.append(record)
+            record = GameRecordOrm(game_id=game.id, user_id=user_id)
+            session.add(record)
+            game.records.append(record)
 
-    if game.state == GameState.completed and game.season_id:
-        await season_repo.revert_season_user_point_by_game(game)
+        if game.state == GameState.completed:
+            await _revert_completed_game(game)
 
-    game.state = GameState.uncompleted
-    record.score = score
-    record.wind = wind
+        game.state = GameState.uncompleted
+        record.score = score
+        record.wind = wind
 
-    if len(game.records) == 4:
-        await _handle_full_recorded_game(game)
+        if len(game.records) == 4:
+            await _handle_full_recorded_game(game)
+
+        game.update_time = datetime.utcnow()
 
-    game.update_time = datetime.utcnow()
-    await session.commit()
     return await map_game(game, session)
 
 
@@ -158,6 +227,7 @@ async def _handle_full_recorded_game(game: GameOrm):
 
     game_repo = GameRepository(session)
     season_repo = SeasonRepository(session)
+    stats_repo = UserGameStatsRepository(session)
 
     progress = await game_repo.get_progress(game.id)
     if progress is not None:
@@ -168,18 +238,15 @@ async def _handle_full_recorded_game(game: GameOrm):
 
     # 计算pt
     if not game.season_id:
+        await stats_repo.add_game(game)
         return
 
     season = await season_repo.get_by_pk(game.season_id)
+    params = season.config.get_scoring_params(game.player_and_wind)
 
     # 总分校验
     sum_score = sum(map(lambda r: r.score, game.records))
-    if game.player_and_wind == PlayerAndWind.four_men_east:
-        except_sum_score = season.config.east_game_initial_point * 4
-    elif game.player_and_wind == PlayerAndWind.four_men_south:
-        except_sum_score = season.config.south_game_initial_point * 4
-    else:
-        raise ValueError("invalid players and wind")
+    except_sum_score = params.initial_point * 4
 
     if sum_score != except_sum_score:
         game.state = GameState.invalid_total_point
@@ -194,15 +261,9 @@ async def _handle_full_recorded_game(game: GameOrm):
 
     if season.config.rank_point_policy & RankPointPolicy.absolute_rank_point \
             or season.config.rank_point_policy & RankPointPolicy.horse_point:
-        # 绝对顺位点 或 马点
-        if game.player_and_wind == PlayerAndWind.four_men_east:
-            horse_point = season.config.east_game_horse_point
-            origin_point = season.config.east_game_origin_point
-        elif game.player_and_wind == PlayerAndWind.four_men_south:
-            horse_point = season.config.south_game_horse_point
-            origin_point = season.config.south_game_origin_point
-        else:
-            raise ValueError("invalid players and wind")
+        # 绝对顺位点 或 马点（复制一份，平分顺位点时会修改）
+        horse_point = list(params.horse_point)
+        origin_point = params.origin_point
 
         # 同分平分顺位点
         _handle_horse_point(horse_point, indexed_record)
@@ -219,16 +280,7 @@ async def _handle_full_recorded_game(game: GameOrm):
 
     if season.config.rank_point_policy & RankPointPolicy.first_rank_prize:
         # 头名赏
-        if game.player_and_wind == PlayerAndWind.four_men_east:
-            initial_point = season.config.east_game_initial_point
-            origin_point = season.config.east_game_origin_point
-        elif game.player_and_wind == PlayerAndWind.four_men_south:
-            initial_point = season.config.south_game_initial_point
-            origin_point = season.config.south_game_origin_point
-        else:
-            raise ValueError("invalid players and wind")
-
-        horse_point = [(origin_point - initial_point) * (10 ** (-point_scale - 3)) * 4, 0, 0, 0]
+        horse_point = [(params.origin_point - params.initial_point) * (10 ** (-point_scale - 3)) * 4, 0, 0, 0]
         # 同分平分头名赏
         _handle_horse_point(horse_point, indexed_record)
 
@@ -242,15 +294,8 @@ async def _handle_full_recorded_game(game: GameOrm):
             if r.score >= 30000:
                 overwater_num += 1
 
-        # 头名赏
-        if game.player_and_wind == PlayerAndWind.four_men_east:
-            horse_point = season.config.east_game_overwater_point[overwater_num]
-            origin_point = season.config.east_game_origin_point
-        elif game.player_and_wind == PlayerAndWind.four_men_south:
-            horse_point = season.config.south_game_overwater_point[overwater_num]
-            origin_point = season.config.south_game_origin_point
-        else:
-            raise ValueError("invalid players and wind")
+        horse_point = list(params.overwater_point[overwater_num])
+        origin_point = params.origin_point
 
         # 同分平分顺位点
         _handle_horse_point(horse_point, indexed_record)
@@ -268,6 +313,21 @@ async def _handle_full_recorded_game(game: GameOrm):
         r.rank = rank
 
     await season_repo.change_season_user_point_by_game(game)
+    await stats_repo.add_game(game)
+
+
+async def _revert_completed_game(game: GameOrm):
+    """
+    撤销已完成对局的结算，包括赛季PT及对战数据
+    """
+    session = data_source.session()
+
+    season_repo = SeasonRepository(session)
+    stats_repo = UserGameStatsRepository(session)
+
+    if game.season_id:
+        await season_repo.revert_season_user_point_by_game(game)
+    await stats_repo.remove_game(game)
 
 
 def _handle_horse_point(horse_point: List[int], indexed_record: List[Tuple[GameRecordOrm, int]]):
@@ -309,6 +369,7 @@ def _divide_horse_point(horse_point: List[int], start: int, end: int):
         horse_point[start] += rest_horse_point
 
 
+@_retry_on_conflict
 async def revert_record(game_code: int,
                         group_id: int,
                         user_id: int,
@@ -316,58 +377,54 @@ async def revert_record(game_code: int,
     session = data_source.session()
 
     game_repo = GameRepository(session)
-    season_repo = SeasonRepository(session)
 
-    game = await game_repo.get_by_code(game_code, group_id)
-    if game is None:
-        raise QueryError("未找到指定对局")
+    version = await _check_before_write(game_code, group_id, operator_user_id)
 
-    await _ensure_updatable(game)
-    await _ensure_permission(game, group_id, operator_user_id)
+    async with group_lock(group_id), write_transaction(session):
+        game = await game_repo.get_by_code(game_code, group_id)
+        _ensure_still_permitted(game, version)
+        await _ensure_updatable(game)
 
-    for r in game.records:
-        if r.user_id == user_id:
-            record = r
-            break
-    else:
-        raise QueryError("用户还没有记录过这场对局")
+        for r in game.records:
+            if r.user_id == user_id:
+                record = r
+                break
+        else:
+            raise QueryError("用户还没有记录过这场对局")
 
-    if game.state == GameState.completed and game.season_id:
-        await season_repo.revert_season_user_point_by_game(game)
+        if game.state == GameState.completed:
+            await _revert_completed_game(game)
 
-    game.state = GameState.uncompleted
-    game.records.remove(record)
-    await session.delete(record)
+        game.state = GameState.uncompleted
+        game.records.remove(record)
+        await session.delete(record)
+
+        game.update_time = datetime.utcnow()
 
-    game.update_time = datetime.utcnow()
-    await session.commit()
     return await map_game(game, session)
 
 
+@_retry_on_conflict
 async def delete_game(game_code: int,
                       group_id: int,
                       operator_user_id: int):
     session = data_source.session()
 
     game_repo = GameRepository(session)
-    season_repo = SeasonRepository(session)
 
-    game = await game_repo.get_by_code(game_code, group_id)
-    if game is None:
-        raise QueryError("未找到指定对局")
+    version = await _check_before_write(game_code, group_id, operator_user_id, admin_only=True)
 
-    await _ensure_updatable(game)
+    async with group_lock(group_id), write_transaction(session):
+        game = await game_repo.get_by_code(game_code, group_id)
+        _ensure_still_permitted(game, version)
+        await _ensure_updatable(game)
 
-    if not await is_group_admin(operator_user_id, group_id):
-        raise QueryError("需要管理员权限进行该操作")
+        if game.state == GameState.completed:
+            await _revert_completed_game(game)
 
-    if game.state == GameState.completed and game.season_id:
-        await season_repo.revert_season_user_point_by_game(game)
-
-    game.accessible = False
-    game.delete_time = datetime.utcnow()
-    game.update_time = datetime.utcnow()
-    await session.commit()
+        game.accessible = False
+        game.delete_time = datetime.utcnow()
+        game.update_time = datetime.utcnow()
 
 
 async def delete_uncompleted_season_games(season_id: int):
@@ -376,119 +433,125 @@ async def delete_uncompleted_season_games(season_id: int):
     await repo.delete_uncompleted_games(season_id)
 
 
+@_retry_on_conflict
 async def make_game_progress(game_code: int, round: int, honba: int,
                              group_id: int, operator_user_id: int):
     session = data_source.session()
 
     game_repo = GameRepository(session)
-    season_repo = SeasonRepository(session)
 
-    game = await game_repo.get_by_code(game_code, group_id)
-    if game is None:
-        raise QueryError("未找到指定对局")
+    version = await _check_before_write(game_code, group_id, operator_user_id)
 
-    await _ensure_updatable(game)
-    await _ensure_permission(game, group_id, operator_user_id)
+    async with group_lock(group_id), write_transaction(session):
+        game = await game_repo.get_by_code(game_code, group_id)
+        _ensure_still_permitted(game, version)
+        await _ensure_updatable(game)
 
-    if game.state == GameState.completed and game.season_id:
-        await season_repo.revert_season_user_point_by_game(game)
+        if game.state == GameState.completed:
+            await _revert_completed_game(game)
 
-    game.state = GameState.uncompleted
+        game.state = GameState.uncompleted
 
-    progress = await game_repo.get_progress(game.id)
-    if progress is None:
-        progress = GameProgressOrm(game_id=game.id)
-        session.add(progress)
+        progress = await game_repo.get_progress(game.id)
+        if progress is None:
+            progress = GameProgressOrm(game_id=game.id)
+            session.add(progress)
+            game.progress = progress
 
-    progress.round = round
-    progress.honba = honba
+        progress.round = round
+        progress.honba = honba
+
+        game.update_time = datetime.utcnow()
 
-    game.update_time = datetime.utcnow()
-    await session.commit()
-    await session.refresh(game)  # 刷新一下，保证能拿到game.progress
     return await map_game(game, session)
 
 
+@_retry_on_conflict
 async def remove_game_progress(game_code: int, group_id: int):
     session = data_source.session()
 
     game_repo = GameRepository(session)
 
-    game = await game_repo.get_by_code(game_code, group_id)
-    if game is None:
-        raise QueryError("未找到指定对局")
+    async with group_lock(group_id), write_transaction(session):
+        game = await game_repo.get_by_code(game_code, group_id)
+        if game is None:
+            raise QueryError("未找到指定对局")
 
-    await _ensure_updatable(game)
+        await _ensure_updatable(game)
 
-    progress = await game_repo.get_progress(game.id)
-    if progress is not None:
-        # 不能用session.delete，否则之后session.get还能获取到
-        stmt = delete(GameProgressOrm).where(GameProgressOrm.game_id == game.id)
-        await session.execute(stmt)
+        progress = await game_repo.get_progress(game.id)
+        if progress is not None:
+            # 不能用session.delete，否则之后session.get还能获取到
+            stmt = delete(GameProgressOrm).where(GameProgressOrm.game_id == game.id)
+            await session.execute(stmt)
+            set_committed_value(game, "progress", None)
 
-        if len(game.records) == 4:
-            await _handle_full_recorded_game(game)
+            if len(game.records) == 4:
+                await _handle_full_recorded_game(game)
+
+        game.update_time = datetime.utcnow()
 
-    game.update_time = datetime.utcnow()
-    await session.commit()
     return await map_game(game, session)
 
 
+@_retry_on_conflict
 async def set_record_point(game_code: int, group_id: int, user_id: int, point: float, operator_user_id: int):
     session = data_source.session()
 
     game_repo = GameRepository(session)
     season_repo = SeasonRepository(session)
 
-    game = await game_repo.get_by_code(game_code, group_id)
-    if game is None:
-        raise QueryError("未找到指定对局")
+    version = await _check_before_write(game_code, group_id, operator_user_id)
 
-    await _ensure_updatable(game)
-    await _ensure_permission(game, group_id, operator_user_id)
+    async with group_lock(group_id), write_transaction(session):
+        game = await game_repo.get_by_code(game_code, group_id)
+        _ensure_still_permitted(game, version)
+        await _ensure_updatable(game)
 
-    for r in game.records:
-        if r.user_id == user_id:
-            record = r
-            break
-    else:
-        raise QueryError("用户还没有记录过这场对局")
+        for r in game.records:
+            if r.user_id == user_id:
+                record = r
+                break
+        else:
+            raise QueryError("用户还没有记录过这场对局")
 
-    if game.state != GameState.completed:
-        raise QueryError("这场对局未处于完成状态")
+        if game.state != GameState.completed:
+            raise QueryError("这场对局未处于完成状态")
 
-    if game.season_id is None:
-        raise QueryError("这场对局不属于赛季")
+        if game.season_id is None:
+            raise QueryError("这场对局不属于赛季")
 
-    await season_repo.revert_season_user_point_by_game(game)
+        await _revert_completed_game(game)
 
-    season = await season_repo.get_by_pk(game.season_id)
-    record.point_scale = season.config.point_precision
-    record.raw_point = int(point * (10 ** -season.config.point_precision))
+        season = await season_repo.get_by_pk(game.season_id)
+        record.point_scale = season.config.point_precision
+        record.raw_point = int(point * (10 ** -season.config.point_precision))
 
-    await season_repo.change_season_user_point_by_game(game)
+        await season_repo.change_season_user_point_by_game(game)
+        await UserGameStatsRepository(session).add_game(game)
+
+        game.update_time = datetime.utcnow()
 
-    game.update_time = datetime.utcnow()
-    await session.commit()
     return await map_game(game, session)
 
 
+@_retry_on_conflict
 async def set_game_comment(game_code: int, group_id: int, comment: str, operator_user_id: int):
     session = data_source.session()
 
     game_repo = GameRepository(session)
 
-    game = await game_repo.get_by_code(game_code, group_id)
-    if game is None:
-        raise QueryError("未找到指定对局")
+    version = await _check_before_write(game_code, group_id, operator_user_id)
 
-    await _ensure_updatable(game)
-    await _ensure_permission(game, group_id, operator_user_id)
+    async with write_transaction(session):
+        game = await game_repo.get_by_code(game_code, group_id)
+        _ensure_still_permitted(game, version)
+        await _ensure_updatable(game)
 
-    game.comment = comment
+        game.comment = comment
+
+        game.update_time = datetime.utcnow()
 
-    game.update_time = datetime.utcnow()
-    await session.commit()
     return await map_game(game, session)
 
 
@@ -509,74 +572,92 @@ async def get_games(group_id: int, user_id: Optional[int] = None, season_id: Opt
     game_repo = GameRepository(session)
     games = await game_repo.get(group_id, user_id, season_id, **kwargs)
 
-    data = [await map_game(g, session) for g in games.data]
+    data = await map_games(games.data, session)
     return Page(data=data, total=games.total)
 
 
-def _get_game_statistics_by_games(games: List[GameOrm], user_id: int,
-                                  is_same_season: bool = False) -> GameStatistics:
-    if len(games) == 0:
-        raise QueryError("用户还没有进行对局")
+@overload
+async def get_games_by_cursor(group_id: int, user_id: Optional[int] = None, season_id: Optional[int] = None,
+                              *, cursor: Optional[int] = ...,
+                              limit: Optional[int] = ...,
+                              reverse_order: bool = ...,
+                              with_total: bool = ...,
+                              uncompleted_only: bool = ...,
+                              completed_only: bool = ...,
+                              time_span: Optional[Tuple[datetime, datetime]] = ...) -> Page[Game]:
+    ...
 
-    total = len(games)
 
-    total_east = 0
-    total_south = 0
+async def get_games_by_cursor(group_id: int, user_id: Optional[int] = None, season_id: Optional[int] = None,
+                              **kwargs) -> Page[Game]:
+    session = data_source.session()
+    game_repo = GameRepository(session)
+    games = await game_repo.get_by_cursor(group_id, user_id, season_id, **kwargs)
 
-    for g in games:
-        if g.player_and_wind == PlayerAndWind.four_men_south:
-            total_south += 1
-        elif g.player_and_wind == PlayerAndWind.four_men_east:
-            total_east += 1
+    data = await map_games(games.data, session)
+    return Page(data=data, total=games.total, next_cursor=games.next_cursor)
 
-    cnt = [0, 0, 0, 0]
 
-    sum_point = 0.0
+async def iter_games(group_id: int, user_id: Optional[int] = None, season_id: Optional[int] = None,
+                     *, chunk_size: int = 200, **kwargs) -> AsyncIterator[Game]:
+    """
+    按GameOrm.id顺序分块查询并逐个返回对局，每块查询后即映射，避免一次性加载所有对局
 
-    flying = 0
+    :param kwargs: 同get_games_by_cursor的过滤条件（uncompleted_only、completed_only、time_span）
+    """
+    session = data_source.session()
+    game_repo = GameRepository(session)
 
-    for g in games:
-        for r in g.records:
-            if r.user_id == user_id:
-                cnt[r.rank - 1] += 1
+    cursor = None
+    while True:
+        games = await game_repo.get_by_cursor(group_id, user_id, season_id, cursor=cursor, limit=chunk_size, **kwargs)
+        for game in await map_games(games.data, session):
+            yield game
 
-                if r.score < 0:
-                    flying += 1
+        if games.next_cursor is None:
+            break
+        cursor = games.next_cursor
 
-                sum_point += r.point
 
-                break
+def _map_game_statistics(stats: Optional[UserGameStatsOrm], is_same_season: bool = False) -> GameStatistics:
+    if stats is None or stats.total == 0:
+        raise QueryError("用户还没有进行对局")
+
+    total = stats.total
+    cnt = [stats.rank_1, stats.rank_2, stats.rank_3, stats.rank_4]
 
     rates = list(map(lambda x: x / total, cnt))
 
     avg_rank = (cnt[0] * 1 + cnt[1] * 2 + cnt[2] * 3 + cnt[3] * 4) / total
 
     if is_same_season:
-        pt_expectation = sum_point / total
+        pt_expectation = stats.sum_point / total
     else:
         pt_expectation = None
 
-    flying_rate = flying / total
+    flying_rate = stats.flying / total
 
-    return GameStatistics(total, total_east, total_south, rates, avg_rank, pt_expectation, flying_rate)
+    return GameStatistics(total, stats.total_east, stats.total_south, rates, avg_rank, pt_expectation, flying_rate)
 
 
 async def get_game_statistics(group_id: int, user_id: int):
     session = data_source.session()
 
-    game_repo = GameRepository(session)
-    games = await game_repo.get(group_id, user_id, completed_only=True)
-    return _get_game_statistics_by_games(games.data, user_id)
+    stats_repo = UserGameStatsRepository(session)
+    stats = await stats_repo.get(group_id, user_id, ALL_SEASONS)
+    if stats is None:
+        stats = await stats_repo.aggregate(group_id, user_id, ALL_SEASONS)
+    return _map_game_statistics(stats)
 
 
 async def get_season_game_statistics(group_id: int, user_id: int, season_id: int):
     session = data_source.session()
 
-    season = await session.get(SeasonOrm, season_id)
-
-    game_repo = GameRepository(session)
-    games = await game_repo.get(group_id, user_id, season.id, completed_only=True)
-    return _get_game_statistics_by_games(games.data, user_id, is_same_season=True)
+    stats_repo = UserGameStatsRepository(session)
+    stats = await stats_repo.get(group_id, user_id, season_id)
+    if stats is None:
+        stats = await stats_repo.aggregate(group_id, user_id, season_id)
+    return _map_game_statistics(stats, is_same_season=True)
 
 
 __all__ = ("new_game", "delete_game", "record_game", "revert_record", "set_record_point",
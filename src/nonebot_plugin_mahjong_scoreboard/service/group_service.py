@@ -1,33 +1,60 @@
+from typing import Tuple
+
+from cachetools import TTLCache
 from nonebot.internal.matcher import current_bot
-from ssttkkl_nonebot_utils.platform import platform_func
 
-from .mapper import map_group
 from ..config import conf
 from ..model import Group
 from ..model.identity import PlatformId, convert_platform_id_to_session
 from ..repository import data_source
 from ..repository.data_model import GroupOrm
 from ..repository.group import GroupRepository
-from ..repository.user import UserOrm
+from ..repository.user import UserOrm, UserRepository
+
+# (bot_id, group_id, user_id) -> 是否为管理员
+_group_admin_cache_enabled = conf.mahjong_scoreboard_group_admin_cache_ttl > 0
+_group_admin_cache = TTLCache[Tuple[str, int, int], bool](4096, max(conf.mahjong_scoreboard_group_admin_cache_ttl, 1))
 
 
 async def get_group(platform_group_id: PlatformId) -> Group:
     session = data_source.session()
     repo = GroupRepository(session)
-    group = await repo.get(str(platform_group_id))
-    return await map_group(group, session)
+    group_id = await repo.get_id(str(platform_group_id))
+    return Group(id=group_id, platform_group_id=platform_group_id)
 
 
 async def is_group_admin(user_id: int, group_id: int) -> bool:
     if not conf.mahjong_scoreboard_enable_permission_check:
         return True
 
+    from ssttkkl_nonebot_utils.platform import platform_func
+
     bot = current_bot.get()
 
+    key = (bot.self_id, group_id, user_id)
+    if _group_admin_cache_enabled and key in _group_admin_cache:
+        return _group_admin_cache[key]
+
     session = data_source.session()
     user = await session.get(UserOrm, user_id)
     group = await session.get(GroupOrm, group_id)
     session = convert_platform_id_to_session(bot, PlatformId.parse(user.platform_user_id),
                                              PlatformId.parse(group.platform_group_id))
 
-    return await platform_func(bot).is_group_admin(session)
+    admin = await platform_func(bot).is_group_admin(session)
+    if _group_admin_cache_enabled:
+        _group_admin_cache[key] = admin
+    return admin
+
+
+async def invalidate_group_admin(platform_user_id: PlatformId):
+    """
+    用户的身份发生变动时，清除其在所有群组的管理员身份缓存
+    """
+    session = data_source.session()
+    user_id = await UserRepository(session).get_id(str(platform_user_id), insert_on_missing=False)
+    if user_id is None:
+        return
+
+    for key in [k for k in _group_admin_cache.keys() if k[2] == user_id]:
+        _group_admin_cache.pop(key, None)
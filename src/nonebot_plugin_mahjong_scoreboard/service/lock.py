@@ -0,0 +1,12 @@
+from asyncio import Lock
+
+from ..utils.lock import LockRegistry
+
+_locks = LockRegistry()
+
+
+def group_lock(group_id: int) -> Lock:
+    """
+    串行化对群组的写操作（修改赛季状态、结算赛季PT）
+    """
+    return _locks.get(("group", group_id))
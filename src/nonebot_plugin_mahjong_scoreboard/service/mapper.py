@@ -1,81 +1,174 @@
-from typing import Optional
+from itertools import chain
+from typing import Optional, Iterable, Dict, List, Type, TypeVar, Sequence, Collection
 
+from sqlalchemy import select, inspect
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.interfaces import ORMOption
 
 from ..model import Game, Season, Group, User, SeasonUserPoint, GameProgress, GameRecord, SeasonUserPointChangeLog, \
     PlatformId
 from ..repository.data_model import GameOrm, GameProgressOrm, GameRecordOrm, GroupOrm, SeasonOrm, SeasonUserPointOrm, \
     UserOrm, SeasonUserPointChangeLogOrm
+from ..repository.game import GameLoadPlan
 
+T_Orm = TypeVar("T_Orm")
 
-async def map_group(group: Optional[GroupOrm], session: AsyncSession) -> Optional[Group]:
+
+async def _get_by_ids(session: AsyncSession, entity: Type[T_Orm], ids: Iterable[Optional[int]],
+                      options: Sequence[ORMOption] = (), required: Collection[str] = ()) -> Dict[int, T_Orm]:
+    """
+    批量获取实体：已在session中加载的实体直接复用，其余的通过一次IN查询获取
+    :param options: 查询时的加载选项
+    :param required: 复用session中的实体时，要求已加载的属性
+    """
+    result = {}
+    missing = set()
+
+    for id_ in ids:
+        if id_ is None or id_ in result or id_ in missing:
+            continue
+
+        obj = session.identity_map.get(session.identity_key(entity, id_))
+        state = inspect(obj) if obj is not None else None
+        if state is not None and not state.expired_attributes and state.unloaded.isdisjoint(required):
+            result[id_] = obj
+        else:
+            missing.add(id_)
+
+    if len(missing) > 0:
+        stmt = select(entity).where(entity.id.in_(missing)).options(*options)
+        for obj in (await session.execute(stmt)).scalars():
+            result[obj.id] = obj
+
+    return result
+
+
+def _map_group(group: Optional[GroupOrm]) -> Optional[Group]:
     if group is None:
         return None
     return Group(id=group.id, platform_group_id=PlatformId.parse(group.platform_group_id))
 
 
-async def map_user(user: Optional[UserOrm], session: AsyncSession) -> Optional[User]:
+def _map_user(user: Optional[UserOrm]) -> Optional[User]:
     if user is None:
         return None
     return User(id=user.id, platform_user_id=PlatformId.parse(user.platform_user_id))
 
 
-async def map_season(season: Optional[SeasonOrm], session: AsyncSession) -> Optional[Season]:
+def _map_season(season: Optional[SeasonOrm], groups: Dict[int, GroupOrm]) -> Optional[Season]:
     if season is None:
         return None
-    group = await session.get(GroupOrm, season.group_id) if season.group_id is not None else None
-    return Season(id=season.id, group=await map_group(group, session), state=season.state, code=season.code,
+    return Season(id=season.id, group=_map_group(groups.get(season.group_id)), state=season.state, code=season.code,
                   name=season.name, start_time=season.start_time, finish_time=season.finish_time, config=season.config)
 
 
-async def map_game_record(game_record: Optional[GameRecordOrm], session: AsyncSession) -> Optional[GameRecord]:
+def _map_game_record(game_record: Optional[GameRecordOrm], users: Dict[int, UserOrm]) -> Optional[GameRecord]:
     if game_record is None:
         return None
-    user = await session.get(UserOrm, game_record.user_id) if game_record.user_id is not None else None
-    return GameRecord(user=await map_user(user, session), wind=game_record.wind,
+    return GameRecord(user=_map_user(users.get(game_record.user_id)), wind=game_record.wind,
                       score=game_record.score, rank=game_record.rank,
                       raw_point=game_record.raw_point, point_scale=game_record.point_scale)
 
 
-async def map_game_progress(game_progress: Optional[GameProgressOrm], session: AsyncSession) -> Optional[GameProgress]:
+def _map_game_progress(game_progress: Optional[GameProgressOrm]) -> Optional[GameProgress]:
     if game_progress is None:
         return None
     return GameProgress(round=game_progress.round, honba=game_progress.honba)
 
 
-async def map_game(game: Optional[GameOrm], session: AsyncSession) -> Optional[Game]:
+def _map_game(game: Optional[GameOrm],
+              groups: Dict[int, GroupOrm],
+              users: Dict[int, UserOrm],
+              seasons: Dict[int, Season]) -> Optional[Game]:
     if game is None:
         return None
-    group = await session.get(GroupOrm, game.group_id) if game.group_id is not None else None
-    promoter = await session.get(UserOrm, game.promoter_user_id) if game.promoter_user_id is not None else None
-    season = await session.get(SeasonOrm, game.season_id) if game.season_id is not None else None
     return Game(id=game.id, code=game.code,
-                group=await map_group(group, session),
-                promoter=await map_user(promoter, session),
-                season=await map_season(season, session),
+                group=_map_group(groups.get(game.group_id)),
+                promoter=_map_user(users.get(game.promoter_user_id)),
+                season=seasons.get(game.season_id),
                 player_and_wind=game.player_and_wind, state=game.state,
-                records=[await map_game_record(r, session) for r in game.records],
-                progress=await map_game_progress(game.progress, session),
+                records=[_map_game_record(r, users) for r in game.records],
+                progress=_map_game_progress(game.progress),
                 complete_time=game.complete_time, comment=game.comment)
 
 
-async def map_season_user_point(sup: Optional[SeasonUserPointOrm], session: AsyncSession) -> Optional[SeasonUserPoint]:
-    if sup is None:
+async def map_group(group: Optional[GroupOrm], session: AsyncSession) -> Optional[Group]:
+    return _map_group(group)
+
+
+async def map_user(user: Optional[UserOrm], session: AsyncSession) -> Optional[User]:
+    return _map_user(user)
+
+
+async def map_season(season: Optional[SeasonOrm], session: AsyncSession) -> Optional[Season]:
+    return (await map_seasons([season], session))[0]
+
+
+async def map_seasons(seasons: Sequence[Optional[SeasonOrm]], session: AsyncSession) -> List[Optional[Season]]:
+    groups = await _get_by_ids(session, GroupOrm, (s.group_id for s in seasons if s is not None))
+    return [_map_season(s, groups) for s in seasons]
+
+
+async def map_game_record(game_record: Optional[GameRecordOrm], session: AsyncSession) -> Optional[GameRecord]:
+    if game_record is None:
         return None
-    user = await session.get(UserOrm, sup.user_id) if sup.user_id is not None else None
-    return SeasonUserPoint(user=await map_user(user, session), point=sup.point)
+    users = await _get_by_ids(session, UserOrm, [game_record.user_id])
+    return _map_game_record(game_record, users)
+
+
+async def map_game_progress(game_progress: Optional[GameProgressOrm], session: AsyncSession) -> Optional[GameProgress]:
+    return _map_game_progress(game_progress)
+
+
+async def map_game(game: Optional[GameOrm], session: AsyncSession) -> Optional[Game]:
+    return (await map_games([game], session))[0]
+
+
+async def map_games(games: Sequence[Optional[GameOrm]], session: AsyncSession) -> List[Optional[Game]]:
+    """
+    批量映射对局：所引用的赛季、群组、用户各通过一次查询获取
+    """
+    non_null_games = [g for g in games if g is not None]
+
+    season_orms = await _get_by_ids(session, SeasonOrm, (g.season_id for g in non_null_games))
+    groups = await _get_by_ids(session, GroupOrm, chain((g.group_id for g in non_null_games),
+                                                        (s.group_id for s in season_orms.values())))
+    users = await _get_by_ids(session, UserOrm, chain((g.promoter_user_id for g in non_null_games),
+                                                      (r.user_id for g in non_null_games for r in g.records)))
+
+    seasons = {id_: _map_season(s, groups) for id_, s in season_orms.items()}
+    return [_map_game(g, groups, users, seasons) for g in games]
+
+
+async def map_season_user_point(sup: Optional[SeasonUserPointOrm], session: AsyncSession) -> Optional[SeasonUserPoint]:
+    return (await map_season_user_points([sup], session))[0]
+
+
+async def map_season_user_points(sups: Sequence[Optional[SeasonUserPointOrm]], session: AsyncSession) \
+        -> List[Optional[SeasonUserPoint]]:
+    users = await _get_by_ids(session, UserOrm, (x.user_id for x in sups if x is not None))
+    return [SeasonUserPoint(user=_map_user(users.get(x.user_id)), point=x.point) if x is not None else None
+            for x in sups]
 
 
 async def map_season_user_point_change_log(log: Optional[SeasonUserPointChangeLogOrm], session: AsyncSession) \
         -> Optional[SeasonUserPointChangeLog]:
-    if log is None:
-        return None
-    user = await session.get(UserOrm, log.user_id) if log.user_id is not None else None
-    related_game = await session.get(GameOrm, log.related_game_id) \
-        if log.related_game_id is not None \
-        else None
-    return SeasonUserPointChangeLog(user=await map_user(user, session),
-                                    change_type=log.change_type,
-                                    change_point=log.change_point,
-                                    related_game=await map_game(related_game, session),
-                                    create_time=log.create_time)
+    return (await map_season_user_point_change_logs([log], session))[0]
+
+
+async def map_season_user_point_change_logs(logs: Sequence[Optional[SeasonUserPointChangeLogOrm]],
+                                            session: AsyncSession) -> List[Optional[SeasonUserPointChangeLog]]:
+    non_null_logs = [x for x in logs if x is not None]
+
+    users = await _get_by_ids(session, UserOrm, (x.user_id for x in non_null_logs))
+    related_game_orms = await _get_by_ids(session, GameOrm, (x.related_game_id for x in non_null_logs),
+                                          GameLoadPlan.full.options, GameLoadPlan.full.attributes)
+    related_games = dict(zip(related_game_orms.keys(),
+                             await map_games(list(related_game_orms.values()), session)))
+
+    return [SeasonUserPointChangeLog(user=_map_user(users.get(x.user_id)),
+                                     change_type=x.change_type,
+                                     change_point=x.change_point,
+                                     related_game=related_games.get(x.related_game_id),
+                                     create_time=x.create_time) if x is not None else None
+            for x in logs]
@@ -5,9 +5,10 @@ from ssttkkl_nonebot_utils.errors.errors import BadRequestError, QueryError
 
 from .game_service import delete_uncompleted_season_games
 from .group_service import is_group_admin
-from .mapper import map_season
+from .lock import group_lock
+from .mapper import map_season, map_seasons
 from ..model import Season, SeasonConfig, SeasonState
-from ..repository import data_source
+from ..repository import data_source, write_transaction
 from ..repository.data_model import GroupOrm, SeasonOrm
 from ..repository.season import SeasonRepository
 
@@ -20,15 +21,15 @@ async def _ensure_permission(season: SeasonOrm, operator_user_id: int):
 async def new_season(group_id: int, code: str, name: str, config: SeasonConfig) -> Season:
     session = data_source.session()
 
-    season = SeasonOrm(
-        code=code,
-        name=name,
-        config=config,
-        group_id=group_id
-    )
-    session.add(season)
-    await session.commit()
-    await session.refresh(season)
+    async with group_lock(group_id), write_transaction(session):
+        season = SeasonOrm(
+            code=code,
+            name=name,
+            config=config,
+            group_id=group_id
+        )
+        session.add(season)
+
     return await map_season(season, session)
 
 
@@ -50,7 +51,7 @@ async def get_group_seasons(group_id: int) -> List[Season]:
     session = data_source.session()
     repo = SeasonRepository(session)
     seasons = await repo.get_group_seasons(group_id)
-    return [await map_season(s, session) for s in seasons]
+    return await map_seasons(seasons, session)
 
 
 async def get_group_running_season(group_id: int) -> Optional[Season]:
@@ -73,18 +74,21 @@ async def start_season(season_id: int, operator_user_id: int):
 
     await _ensure_permission(season, operator_user_id)
 
-    group: GroupOrm = await session.get(GroupOrm, season.group_id)
-    if season.state != SeasonState.initial:
-        raise QueryError("该赛季已经开启或已经结束")
-    if group.running_season_id:
-        raise QueryError("当前已经有开启的赛季")
+    async with group_lock(season.group_id), write_transaction(session):
+        # 等待锁期间赛季可能已被修改，需重新读取
+        await session.refresh(season)
+
+        group: GroupOrm = await session.get(GroupOrm, season.group_id, populate_existing=True)
+        if season.state != SeasonState.initial:
+            raise QueryError("该赛季已经开启或已经结束")
+        if group.running_season_id:
+            raise QueryError("当前已经有开启的赛季")
 
-    season.state = SeasonState.running
-    season.start_time = datetime.utcnow()
-    group.running_season_id = season.id
+        season.state = SeasonState.running
+        season.start_time = datetime.utcnow()
+        group.running_season_id = season.id
 
-    season.update_time = datetime.utcnow()
-    await session.commit()
+        season.update_time = datetime.utcnow()
 
 
 async def finish_season(season_id: int, operator_user_id: int):
@@ -96,19 +100,22 @@ async def finish_season(season_id: int, operator_user_id: int):
 
     await _ensure_permission(season, operator_user_id)
 
-    if season.state != SeasonState.running:
-        raise QueryError("该赛季尚未开启或已经结束")
+    async with group_lock(season.group_id), write_transaction(session):
+        # 等待锁期间赛季可能已被修改，需重新读取
+        await session.refresh(season)
 
-    await delete_uncompleted_season_games(season.id)
+        if season.state != SeasonState.running:
+            raise QueryError("该赛季尚未开启或已经结束")
 
-    season.state = SeasonState.finished
-    season.finish_time = datetime.utcnow()
+        await delete_uncompleted_season_games(season.id)
 
-    group = await session.get(GroupOrm, season.group_id)
-    group.running_season_id = None
+        season.state = SeasonState.finished
+        season.finish_time = datetime.utcnow()
 
-    season.update_time = datetime.utcnow()
-    await session.commit()
+        group = await session.get(GroupOrm, season.group_id, populate_existing=True)
+        group.running_season_id = None
+
+        season.update_time = datetime.utcnow()
 
 
 async def remove_season(season_id: int, operator_user_id: int):
@@ -120,10 +127,13 @@ async def remove_season(season_id: int, operator_user_id: int):
 
     await _ensure_permission(season, operator_user_id)
 
-    if season.state != SeasonState.initial:
-        raise QueryError("该赛季已经开启或已经结束")
+    async with group_lock(season.group_id), write_transaction(session):
+        # 等待锁期间赛季可能已被修改，需重新读取
+        await session.refresh(season)
+
+        if season.state != SeasonState.initial:
+            raise QueryError("该赛季已经开启或已经结束")
 
-    season.accessible = False
-    season.delete_time = datetime.utcnow()
-    season.update_time = datetime.utcnow()
-    await session.commit()
+        season.accessible = False
+        season.delete_time = datetime.utcnow()
+        season.update_time = datetime.utcnow()
@@ -1,23 +1,37 @@
-from typing import Optional, List
+from typing import Optional, List, AsyncIterator
 
 from ssttkkl_nonebot_utils.errors.errors import QueryError
 
 from .group_service import is_group_admin
-from .mapper import map_season_user_point, map_season_user_point_change_log
-from ..model import SeasonUserPoint, SeasonUserPointChangeLog
-from ..repository import data_source
+from .lock import group_lock
+from .mapper import map_season_user_point, map_season_user_points, map_season_user_point_change_logs
+from ..model import SeasonUserPoint, SeasonUserPointChangeLog, SeasonUserPointChangeLogRow, PlatformId, User
+from ..repository import data_source, write_transaction
+from ..repository.leaderboard import SeasonLeaderboardEntry
 from ..repository.season import SeasonRepository
 
 
+def _map_leaderboard_entry(entry: SeasonLeaderboardEntry, total: int) -> SeasonUserPoint:
+    return SeasonUserPoint(user=User(id=entry.user_id, platform_user_id=PlatformId.parse(entry.platform_user_id)),
+                           point=entry.point, rank=entry.rank, total=total)
+
+
 async def get_season_user_point(season_id: int, user_id: int) -> Optional[SeasonUserPoint]:
     session = data_source.session()
     repo = SeasonRepository(session)
-    sup = await repo.get_season_user_point(season_id, user_id)
-    if sup is not None:
-        sup = await map_season_user_point(sup, session)
-        sup.rank = await repo.get_season_user_point_rank(season_id, sup.point)
-        sup.total = await repo.count_season_user_point(season_id)
-        return sup
+
+    leaderboard = await repo.get_leaderboard(season_id)
+    if leaderboard is not None:
+        entry = leaderboard.get(user_id)
+        if entry is not None:
+            return _map_leaderboard_entry(entry, len(leaderboard))
+        else:
+            return None
+
+    row = await repo.get_season_user_point_with_rank(season_id, user_id)
+    if row is not None:
+        return SeasonUserPoint(user=User(id=row.user_id, platform_user_id=PlatformId.parse(row.platform_user_id)),
+                               point=row.point, rank=row.rank, total=row.total)
     else:
         return None
 
@@ -25,8 +39,13 @@ async def get_season_user_point(season_id: int, user_id: int) -> Optional[Season
 async def get_season_user_points(season_id: int) -> List[SeasonUserPoint]:
     session = data_source.session()
     repo = SeasonRepository(session)
+
+    leaderboard = await repo.get_leaderboard(season_id)
+    if leaderboard is not None:
+        return [_map_leaderboard_entry(entry, len(leaderboard)) for entry in leaderboard.top()]
+
     sups = await repo.get_season_user_points(season_id)
-    sups = [await map_season_user_point(x, session) for x in sups]
+    sups = await map_season_user_points(sups, session)
 
     for i, x in enumerate(sups):
         x.rank = i + 1
@@ -40,10 +59,23 @@ async def get_season_user_point_change_logs(season_id: Optional[int] = None,
     session = data_source.session()
     repo = SeasonRepository(session)
     logs = await repo.get_season_user_point_change_logs(season_id, user_id)
-    logs = [await map_season_user_point_change_log(x, session) for x in logs]
+    logs = await map_season_user_point_change_logs(logs, session)
     return logs
 
 
+async def get_season_user_point_change_log_rows(season_id: int) -> AsyncIterator[SeasonUserPointChangeLogRow]:
+    session = data_source.session()
+    repo = SeasonRepository(session)
+    async for row in repo.stream_season_user_point_change_log_rows(season_id):
+        yield SeasonUserPointChangeLogRow(user_id=row.user_id,
+                                          platform_user_id=PlatformId.parse(row.platform_user_id),
+                                          change_type=row.change_type,
+                                          change_point=row.change_point,
+                                          related_game_id=row.related_game_id,
+                                          related_game_code=row.related_game_code,
+                                          create_time=row.create_time)
+
+
 async def reset_season_user_point(season_id: int,
                                   group_id: int,
                                   user_id: int,
@@ -54,7 +86,8 @@ async def reset_season_user_point(season_id: int,
     session = data_source.session()
     repo = SeasonRepository(session)
 
-    await repo.reset_season_user_point(season_id, user_id)
+    async with group_lock(group_id), write_transaction(session):
+        await repo.reset_season_user_point(season_id, user_id)
 
 
 async def change_season_user_point_manually(season_id: int,
@@ -68,5 +101,7 @@ async def change_season_user_point_manually(season_id: int,
     session = data_source.session()
     repo = SeasonRepository(session)
 
-    sup = await repo.change_season_user_point_manually(season_id, user_id, point)
+    async with group_lock(group_id), write_transaction(session):
+        sup = await repo.change_season_user_point_manually(season_id, user_id, point)
+
     return await map_season_user_point(sup, session)
@@ -1,4 +1,3 @@
-from .mapper import map_user
 from ..model import User
 from ..model.identity import PlatformId
 from ..repository import data_source
@@ -8,5 +7,5 @@ from ..repository.user import UserRepository
 async def get_user(platform_user_id: PlatformId) -> User:
     session = data_source.session()
     repo = UserRepository(session)
-    user = await repo.get(str(platform_user_id))
-    return await map_user(user, session)
+    user_id = await repo.get_id(str(platform_user_id))
+    return User(id=user_id, platform_user_id=platform_user_id)
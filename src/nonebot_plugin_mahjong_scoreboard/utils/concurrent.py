@@ -0,0 +1,39 @@
+import asyncio
+from inspect import isawaitable
+from typing import Iterable, TypeVar, Callable, Awaitable, Union, List, Optional
+
+from ..config import conf
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def map_concurrently(func: Union[Callable[[T], Awaitable[R]], Callable[[T], R]],
+                           data: Iterable[T],
+                           limit: Optional[int] = None) -> List[R]:
+    """
+    对data中的每个元素调用func，最多同时等待limit个调用，结果按data的顺序返回
+    :param limit: 最大并发数，为None时使用配置项mahjong_scoreboard_render_concurrency
+    """
+    if limit is None:
+        limit = conf.mahjong_scoreboard_render_concurrency
+
+    if limit <= 1:
+        result = []
+        for x in data:
+            r = func(x)
+            if isawaitable(r):
+                r = await r
+            result.append(r)
+        return result
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def call(x: T) -> R:
+        async with semaphore:
+            r = func(x)
+            if isawaitable(r):
+                r = await r
+            return r
+
+    return list(await asyncio.gather(*[call(x) for x in data]))
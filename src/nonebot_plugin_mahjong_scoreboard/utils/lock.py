@@ -0,0 +1,24 @@
+from asyncio import Lock
+from typing import Generic, TypeVar, Hashable
+from weakref import WeakValueDictionary
+
+K = TypeVar("K", bound=Hashable)
+
+
+class LockRegistry(Generic[K]):
+    """
+    按键分配asyncio.Lock。注册表只持有锁的弱引用，锁在没有协程持有或等待时即被回收，空闲的键不会堆积
+    """
+
+    def __init__(self):
+        self._locks: "WeakValueDictionary[K, Lock]" = WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def get(self, key: K) -> Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = Lock()
+            self._locks[key] = lock
+        return lock
@@ -1,12 +1,111 @@
-from typing import Optional
+from typing import Optional, Iterable, Dict, Tuple, Callable, Awaitable, Collection
 
-from nonebot import Bot
-from ssttkkl_nonebot_utils.platform import platform_func
+from cachetools import TTLCache
+from nonebot import Bot, logger
 
+from nonebot_plugin_mahjong_scoreboard.config import conf
 from nonebot_plugin_mahjong_scoreboard.model import PlatformId
 from nonebot_plugin_mahjong_scoreboard.model.identity import convert_platform_id_to_session
+from nonebot_plugin_mahjong_scoreboard.utils.concurrent import map_concurrently
 
+_NicknameCacheKey = Tuple[Optional[PlatformId], PlatformId]
+
+_nickname_cache_enabled = conf.mahjong_scoreboard_nickname_cache_size > 0
+_nickname_cache = TTLCache[_NicknameCacheKey, str](max(conf.mahjong_scoreboard_nickname_cache_size, 1),
+                                                   conf.mahjong_scoreboard_nickname_cache_ttl)
+
+
+def _cache_nickname(key: _NicknameCacheKey, nickname: str):
+    if _nickname_cache_enabled:
+        _nickname_cache[key] = nickname
+
+
+async def _fetch_user_nickname(bot: Bot, platform_user_id: PlatformId, platform_group_id: Optional[PlatformId]) -> str:
+    from ssttkkl_nonebot_utils.platform import platform_func
 
-async def get_user_nickname(bot: Bot, platform_user_id: PlatformId, platform_group_id: Optional[PlatformId]) -> str:
     session = convert_platform_id_to_session(bot, platform_user_id, platform_group_id)
     return await platform_func(bot).get_user_nickname(session)
+
+
+async def get_user_nickname(bot: Bot, platform_user_id: PlatformId, platform_group_id: Optional[PlatformId]) -> str:
+    key = (platform_group_id, platform_user_id)
+    nickname = _nickname_cache.get(key) if _nickname_cache_enabled else None
+    if nickname is None:
+        nickname = await _fetch_user_nickname(bot, platform_user_id, platform_group_id)
+        _cache_nickname(key, nickname)
+    return nickname
+
+
+# ========== 通过成员列表批量获取昵称 ==========
+
+# QQ频道每页最多获取400个成员，超过该页数后剩余用户逐个获取
+_QQGUILD_MEMBERS_PAGE_SIZE = 400
+_QQGUILD_MEMBERS_MAX_PAGES = 5
+
+
+async def _get_qqguild_member_nicknames(bot: Bot, platform_group_id: PlatformId,
+                                        real_user_ids: Collection[str]) -> Dict[str, str]:
+    # 与ssttkkl_nonebot_utils中qqguild的get_user_nickname一致，取成员的nick
+    guild_id = platform_group_id.real_id.split("_", maxsplit=1)[0]
+
+    result = {}
+    after = None
+    for _ in range(_QQGUILD_MEMBERS_MAX_PAGES):
+        members = await bot.get_members(guild_id=int(guild_id), after=after, limit=_QQGUILD_MEMBERS_PAGE_SIZE)
+        for member in members:
+            if member.user is not None and str(member.user.id) in real_user_ids:
+                result[str(member.user.id)] = member.nick
+
+        if len(members) < _QQGUILD_MEMBERS_PAGE_SIZE or len(result) == len(real_user_ids) \
+                or members[-1].user is None:
+            break
+        after = str(members[-1].user.id)
+
+    return result
+
+
+async def _get_onebot_v11_member_nicknames(bot: Bot, platform_group_id: PlatformId,
+                                           real_user_ids: Collection[str]) -> Dict[str, str]:
+    # 与ssttkkl_nonebot_utils中onebot v11的get_user_nickname一致，优先取群名片，否则取昵称
+    members = await bot.get_group_member_list(group_id=int(platform_group_id.real_id))
+    return {
+        str(member["user_id"]): member["card"] or member["nickname"]
+        for member in members
+        if str(member["user_id"]) in real_user_ids
+    }
+
+
+_member_nicknames_func: Dict[str, Callable[[Bot, PlatformId, Collection[str]], Awaitable[Dict[str, str]]]] = {
+    "OneBot V11": _get_onebot_v11_member_nicknames,
+    "QQ Guild": _get_qqguild_member_nicknames
+}
+
+
+async def prefetch_nicknames(bot: Bot, platform_user_ids: Iterable[PlatformId],
+                             platform_group_id: Optional[PlatformId]):
+    """
+    批量获取并缓存用户昵称，用于一次绘制多行用户昵称之前。
+    若平台支持获取成员列表，则优先通过成员列表获取，否则逐个（并发）调用平台API
+    """
+    if not _nickname_cache_enabled:
+        return
+
+    missing = {}
+    for platform_user_id in platform_user_ids:
+        if (platform_group_id, platform_user_id) not in _nickname_cache:
+            missing[platform_user_id.real_id] = platform_user_id
+
+    if len(missing) == 0:
+        return
+
+    func = _member_nicknames_func.get(bot.type)
+    if func is not None and platform_group_id is not None and len(missing) > 1:
+        try:
+            nicknames = await func(bot, platform_group_id, missing.keys())
+            for real_id, nickname in nicknames.items():
+                if nickname:
+                    _cache_nickname((platform_group_id, missing.pop(real_id)), nickname)
+        except Exception as e:
+            logger.opt(exception=e).warning("通过成员列表获取用户昵称时发生错误")
+
+    await map_concurrently(lambda x: get_user_nickname(bot, x, platform_group_id), missing.values())
@@ -0,0 +1,156 @@
+import asyncio
+from functools import cache
+from hashlib import sha256
+from importlib.metadata import version, PackageNotFoundError
+from pathlib import Path
+from typing import Optional, Dict, Callable, Awaitable, Tuple
+
+import nonebot_plugin_localstore as store
+from cachetools import LRUCache
+from nonebot import logger
+
+from ..config import conf
+
+
+@cache
+def _renderer_version() -> str:
+    try:
+        return version("nonebot-plugin-htmlrender")
+    except PackageNotFoundError:
+        return ""
+
+
+def render_cache_key(*parts: str) -> str:
+    """
+    根据渲染的内容（文本或HTML）及模板、视口等参数计算缓存键，内容相同的渲染结果必然相同。
+    键中还包含htmlrender的版本，升级后不会读取到磁盘上由旧版本渲染的图片
+    """
+    h = sha256()
+    for p in (_renderer_version(), *parts):
+        data = p.encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class _SpillingLRUCache(LRUCache):
+    def __init__(self, maxsize: int, on_evict: Callable[[str, bytes], None]):
+        super().__init__(maxsize, getsizeof=len)
+        self._on_evict = on_evict
+
+    def popitem(self) -> Tuple[str, bytes]:
+        key, value = super().popitem()
+        self._on_evict(key, value)
+        return key, value
+
+
+class RenderedImageCache:
+    """
+    按内容寻址的渲染图片缓存。内存中按LRU策略保留至多max_bytes字节的图片，
+    若指定了disk_dir，则从内存中淘汰的图片写入磁盘（至多disk_max_bytes字节，超出时删除最早写入的文件）
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[Path] = None, disk_max_bytes: int = 0):
+        self.enabled = max_bytes > 0
+        self._memory = _SpillingLRUCache(max(max_bytes, 1), self._spill)
+        self._disk_dir = disk_dir if disk_max_bytes > 0 else None
+        self._disk_max_bytes = disk_max_bytes
+        self._disk_bytes: Optional[int] = None
+        # 正在渲染的图片，相同内容的并发请求等待同一次渲染
+        self._rendering: Dict[str, asyncio.Future] = {}
+
+    def _disk_file(self, key: str) -> Path:
+        return self._disk_dir / f"{key}.png"
+
+    def _spill(self, key: str, image: bytes):
+        if self._disk_dir is None:
+            return
+
+        try:
+            self._disk_dir.mkdir(parents=True, exist_ok=True)
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(f.stat().st_size for f in self._disk_dir.glob("*.png"))
+
+            f = self._disk_file(key)
+            if not f.exists():
+                f.write_bytes(image)
+                self._disk_bytes += len(image)
+
+            if self._disk_bytes > self._disk_max_bytes:
+                self._prune_disk()
+        except OSError as e:
+            logger.opt(exception=e).warning("写入图片缓存时发生错误")
+
+    def _prune_disk(self):
+        files = sorted(self._disk_dir.glob("*.png"), key=lambda f: f.stat().st_mtime)
+        self._disk_bytes = sum(f.stat().st_size for f in files)
+        for f in files:
+            if self._disk_bytes <= self._disk_max_bytes:
+                break
+            size = f.stat().st_size
+            f.unlink(missing_ok=True)
+            self._disk_bytes -= size
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+
+        image = self._memory.get(key)
+        if image is None and self._disk_dir is not None:
+            try:
+                image = self._disk_file(key).read_bytes()
+            except OSError:
+                return None
+            self.put(key, image)
+        return image
+
+    def put(self, key: str, image: bytes):
+        if not self.enabled:
+            return
+        if len(image) <= self._memory.maxsize:
+            self._memory[key] = image
+        else:
+            self._spill(key, image)
+
+    async def get_or_render(self, key: str, render: Callable[[], Awaitable[bytes]]) -> bytes:
+        image = self.get(key)
+        if image is not None:
+            return image
+
+        if not self.enabled:
+            return await render()
+
+        fut = self._rendering.get(key)
+        if fut is not None:
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._rendering[key] = fut
+        try:
+            image = await render()
+            self.put(key, image)
+            fut.set_result(image)
+            return image
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            # 避免无人等待时出现未获取异常的警告
+            fut.exception()
+            raise
+        finally:
+            del self._rendering[key]
+
+
+def _get_render_cache_dir() -> Optional[Path]:
+    if conf.mahjong_scoreboard_render_cache_disk_size <= 0:
+        return None
+    return store.get_cache_dir("nonebot_plugin_mahjong_scoreboard") / "render"
+
+
+render_cache = RenderedImageCache(conf.mahjong_scoreboard_render_cache_size,
+                                  _get_render_cache_dir(),
+                                  conf.mahjong_scoreboard_render_cache_disk_size)
+
+__all__ = ("RenderedImageCache", "render_cache", "render_cache_key")
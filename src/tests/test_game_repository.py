@@ -0,0 +1,39 @@
+import pytest
+from nonebug import App
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+
+@pytest.mark.asyncio
+async def test_game_load_plan(app: App):
+    from nonebot_plugin_mahjong_scoreboard.repository import data_source
+    from nonebot_plugin_mahjong_scoreboard.repository.data_model import GameOrm, GameRecordOrm, GameProgressOrm
+    from nonebot_plugin_mahjong_scoreboard.repository.game import GameRepository, GameLoadPlan
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(data_source.registry.metadata.create_all)
+
+    async with AsyncSession(engine) as session:
+        session.add(GameOrm(id=1, code=1, group_id=1, records=[GameRecordOrm(user_id=1, score=25000)],
+                            progress=GameProgressOrm(round=1, honba=0)))
+        await session.commit()
+
+    async def load(plan: GameLoadPlan) -> GameOrm:
+        async with AsyncSession(engine) as session:
+            return await GameRepository(session).get_by_code(1, 1, load=plan)
+
+    game = await load(GameLoadPlan.full)
+    assert len(game.records) == 1
+    assert game.progress.round == 1
+
+    game = await load(GameLoadPlan.records)
+    assert len(game.records) == 1
+    with pytest.raises(InvalidRequestError):
+        _ = game.progress
+
+    game = await load(GameLoadPlan.bare)
+    with pytest.raises(InvalidRequestError):
+        _ = game.records
+
+    await engine.dispose()
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from nonebug import App
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+
+async def explain_query_plans(run) -> str:
+    """
+    在空的SQLite数据库上执行run(session)，返回其间每条SQL语句的EXPLAIN QUERY PLAN
+    """
+    from nonebot_plugin_mahjong_scoreboard.repository import data_source
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(data_source.registry.metadata.create_all)
+
+    executed = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith(("SELECT", "UPDATE")):
+            executed.append((statement, parameters))
+
+    async with AsyncSession(engine) as session:
+        await run(session)
+
+    plans = []
+    async with engine.connect() as conn:
+        for statement, parameters in executed:
+            result = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+            plans.extend(row[-1] for row in result)
+
+    await engine.dispose()
+    return "\n".join(plans)
+
+
+@pytest.mark.asyncio
+async def test_game_query_index(app: App):
+    from nonebot_plugin_mahjong_scoreboard.repository.game import GameRepository
+
+    async def run(session):
+        now = datetime.utcnow()
+        await GameRepository(session).get(user_id=1)
+        await GameRepository(session).get(1, time_span=(now - timedelta(days=7), now))
+
+    plans = await explain_query_plans(run)
+    assert "game_records_user_id_game_id_idx (user_id=?)" in plans
+    assert "games_group_id_create_time_idx (group_id=? AND create_time>? AND create_time<?)" in plans
+
+
+@pytest.mark.asyncio
+async def test_season_user_point_query_index(app: App):
+    from nonebot_plugin_mahjong_scoreboard.model import SeasonUserPointChangeType
+    from nonebot_plugin_mahjong_scoreboard.repository.season import SeasonRepository, SeasonUserPointOrm, \
+        SeasonUserPointChangeLogOrm
+
+    async def run(session):
+        session.add(SeasonUserPointOrm(season_id=1, user_id=1, point=20, last_change_log_id=2, change_count=2))
+        session.add(SeasonUserPointChangeLogOrm(id=1, season_id=1, user_id=1,
+                                                change_type=SeasonUserPointChangeType.manually,
+                                                change_point=10))
+        session.add(SeasonUserPointChangeLogOrm(id=2, season_id=1, user_id=1,
+                                                change_type=SeasonUserPointChangeType.game,
+                                                change_point=10, related_game_id=1))
+        await session.commit()
+
+        repo = SeasonRepository(session)
+        await repo.get_season_user_point_with_rank(1, 1)
+        await repo.revert_season_user_point_by_game(SimpleNamespace(id=1))
+
+    plans = await explain_query_plans(run)
+    assert "season_user_points_season_id_point_idx (season_id=?)" in plans
+    assert "season_user_point_change_logs_season_id_user_id_id_idx (season_id=? AND user_id=? AND id<?)" in plans
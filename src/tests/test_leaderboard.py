@@ -0,0 +1,25 @@
+import pytest
+from nonebug import App
+
+
+@pytest.mark.asyncio
+async def test_season_leaderboard(app: App):
+    from nonebot_plugin_mahjong_scoreboard.repository.leaderboard import SeasonLeaderboard
+
+    leaderboard = SeasonLeaderboard([(1, "u1", 10), (2, "u2", 30), (3, "u3", 30), (4, "u4", -5)])
+    assert len(leaderboard) == 4
+    assert [(x.user_id, x.rank) for x in leaderboard.top()] == [(2, 1), (3, 2), (1, 3), (4, 4)]
+    assert [x.user_id for x in leaderboard.top(2)] == [2, 3]
+    assert leaderboard.get(3).rank == 1
+    assert leaderboard.get(1).rank == 3
+    assert leaderboard.get(5) is None
+
+    leaderboard.set_point(1, 40)
+    leaderboard.set_point(5, 0, "u5")
+    leaderboard.remove(2)
+    assert [(x.user_id, x.platform_user_id, x.point) for x in leaderboard.top()] == \
+           [(1, "u1", 40), (3, "u3", 30), (5, "u5", 0), (4, "u4", -5)]
+    assert leaderboard.get(4).rank == 4
+
+    with pytest.raises(KeyError):
+        leaderboard.set_point(6, 10)
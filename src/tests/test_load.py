@@ -1,3 +1,9 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Tuple
+
 import pytest
 from nonebug import App
 
@@ -5,3 +11,49 @@ from nonebug import App
 @pytest.mark.asyncio
 async def test_load(app: App):
     pass
+
+
+# 插件加载时不应导入的模块（仅在首次使用时导入）
+LAZY_MODULES = ("ssttkkl_nonebot_utils.platform", "nonebot_plugin_htmlrender", "prettytable")
+
+# load_plugin耗时上限（秒），仅用于发现明显的启动耗时退化。
+# 耗时取决于机器及负载，因此仅在设置MAHJONG_SCOREBOARD_BENCH=1时检查
+LOAD_PLUGIN_TIME_BUDGET = float(os.environ.get("MAHJONG_SCOREBOARD_LOAD_PLUGIN_TIME_BUDGET", "3"))
+
+_LOAD_PLUGIN_SCRIPT = f"""
+import sys
+import time
+import nonebot
+
+nonebot.init(mahjong_scoreboard_database_conn_url="sqlite+aiosqlite://")
+start = time.perf_counter()
+nonebot.load_plugin("nonebot_plugin_mahjong_scoreboard")
+elapsed = time.perf_counter() - start
+print([m for m in {LAZY_MODULES!r} if m in sys.modules])
+print(elapsed)
+"""
+
+
+def _load_plugin_in_subprocess(cwd: Path) -> Tuple[str, float]:
+    """
+    在新的进程中加载插件，返回加载后已导入的LAZY_MODULES，以及load_plugin的耗时（秒）
+    """
+    result = subprocess.run([sys.executable, "-c", _LOAD_PLUGIN_SCRIPT],
+                            cwd=cwd, capture_output=True, text=True, check=True,
+                            env={**os.environ, "PYTHONPATH": str(Path(__file__).parent.parent), "LOCALSTORE_USE_CWD": "true"})
+    *_, loaded, elapsed = result.stdout.strip().splitlines()
+    return loaded, float(elapsed)
+
+
+def test_lazy_imports(tmp_path):
+    loaded, _ = _load_plugin_in_subprocess(tmp_path)
+    assert loaded == "[]"
+
+
+@pytest.mark.skipif(os.environ.get("MAHJONG_SCOREBOARD_BENCH") != "1",
+                    reason="set MAHJONG_SCOREBOARD_BENCH=1 to check the load_plugin time budget")
+def test_load_plugin_time(tmp_path):
+    # 取多次中的最小值，减少机器负载波动的影响
+    elapsed = min(_load_plugin_in_subprocess(tmp_path)[1] for _ in range(3))
+    assert elapsed < LOAD_PLUGIN_TIME_BUDGET, \
+        f"load_plugin took {elapsed:.2f}s, exceeding budget {LOAD_PLUGIN_TIME_BUDGET:.2f}s"
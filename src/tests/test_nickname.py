@@ -0,0 +1,36 @@
+import pytest
+from nonebug import App
+
+
+class _FakeOneBotV11:
+    type = "OneBot V11"
+    self_id = "10000"
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_group_member_list(self, *, group_id: int):
+        self.calls.append(group_id)
+        return [
+            {"user_id": 1, "card": "名片1", "nickname": "昵称1"},
+            {"user_id": 2, "card": "", "nickname": "昵称2"},
+            {"user_id": 3, "card": "名片3", "nickname": "昵称3"},
+        ]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_nicknames_onebot_v11(app: App):
+    from nonebot_plugin_mahjong_scoreboard.model import PlatformId
+    from nonebot_plugin_mahjong_scoreboard.utils.nickname import prefetch_nicknames, get_user_nickname
+
+    bot = _FakeOneBotV11()
+    group_id = PlatformId("qq", "OneBot V11", "12345")
+    user_ids = [PlatformId("qq", "OneBot V11", "1"), PlatformId("qq", "OneBot V11", "2")]
+
+    # 一次获取成员列表即可缓存所有用户的昵称，之后不再调用平台API
+    await prefetch_nicknames(bot, user_ids, group_id)
+    assert bot.calls == [12345]
+
+    assert await get_user_nickname(bot, user_ids[0], group_id) == "名片1"
+    assert await get_user_nickname(bot, user_ids[1], group_id) == "昵称2"
+    assert bot.calls == [12345]
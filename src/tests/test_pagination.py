@@ -0,0 +1,29 @@
+import asyncio
+import random
+
+import pytest
+from nonebug import App
+
+
+@pytest.mark.asyncio
+async def test_map_pagination_keeps_order(app: App):
+    from nonebot_plugin_mahjong_scoreboard.controller.mapper.pagination_mapper import map_pagination
+
+    running = 0
+    max_running = 0
+
+    async def mapper(x: int) -> str:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(random.random() / 100)
+        running -= 1
+        return str(x)
+
+    msgs = await map_pagination(list(range(25)), mapper, concurrency=4)
+    assert msgs == ["\n".join(map(str, range(0, 10))),
+                    "\n".join(map(str, range(10, 20))),
+                    "\n".join(map(str, range(20, 25)))]
+    assert 1 < max_running <= 4
+
+    assert await map_pagination([1, 2], str, concurrency=1) == ["1\n2"]
@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+from nonebug import App
+
+
+@pytest.mark.asyncio
+async def test_rendered_image_cache(app: App, tmp_path):
+    from nonebot_plugin_mahjong_scoreboard.utils.render_cache import RenderedImageCache, render_cache_key
+
+    renders = []
+
+    async def render(content: bytes) -> bytes:
+        renders.append(content)
+        await asyncio.sleep(0)
+        return content
+
+    cache = RenderedImageCache(10, tmp_path, 100)
+    key_a, key_b = render_cache_key("text", "a"), render_cache_key("text", "b")
+    assert key_a != key_b
+
+    # 相同内容的并发请求只渲染一次
+    results = await asyncio.gather(*[cache.get_or_render(key_a, lambda: render(b"aaaaaa")) for _ in range(3)])
+    assert results == [b"aaaaaa"] * 3
+    assert renders == [b"aaaaaa"]
+
+    # 超出内存大小后，淘汰的图片写入磁盘，之后从磁盘读取
+    assert await cache.get_or_render(key_b, lambda: render(b"bbbbbb")) == b"bbbbbb"
+    assert (tmp_path / f"{key_a}.png").exists()
+    assert await cache.get_or_render(key_a, lambda: render(b"aaaaaa")) == b"aaaaaa"
+    assert renders == [b"aaaaaa", b"bbbbbb"]
+
+    disabled = RenderedImageCache(0)
+    await disabled.get_or_render(key_a, lambda: render(b"aaaaaa"))
+    await disabled.get_or_render(key_a, lambda: render(b"aaaaaa"))
+    assert len(renders) == 4
@@ -0,0 +1,84 @@
+import pytest
+from nonebug import App
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+
+@pytest.mark.asyncio
+async def test_user_game_stats_after_online_migration_failed(app: App, tmp_path, monkeypatch):
+    from nonebot_plugin_mahjong_scoreboard.model import GameState
+    from nonebot_plugin_mahjong_scoreboard.repository import data_source, is_migrating
+    from nonebot_plugin_mahjong_scoreboard.repository.data_model import GroupOrm, GameOrm, GameRecordOrm
+    from nonebot_plugin_mahjong_scoreboard.repository.statistics import UserGameStatsRepository
+    from nonebot_plugin_mahjong_scoreboard.repository._data_source import migrate
+    from nonebot_plugin_mahjong_scoreboard.repository._data_source.metainfo import get_metainfo, set_metainfo
+    from nonebot_plugin_mahjong_scoreboard.repository._data_source.migrations.v6_to_v7 import \
+        user_game_stats_migration as migration
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite3'}")
+    monkeypatch.setattr(data_source, "_engine", engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(data_source.registry.metadata.create_all)
+
+    code = 0
+
+    def completed_game(group_id: int) -> GameOrm:
+        nonlocal code
+        code += 1
+        return GameOrm(code=code, group_id=group_id, state=GameState.completed,
+                       records=[GameRecordOrm(user_id=i, score=25000, rank=i, raw_point=0) for i in range(1, 5)])
+
+    async with AsyncSession(engine) as session:
+        session.add_all([GroupOrm(id=1, platform_group_id="g1"), GroupOrm(id=2, platform_group_id="g2")])
+        session.add_all([completed_game(1), completed_game(2)])
+        await session.commit()
+
+    # 第一批（群组1）完成后迁移失败
+    run_batch = migration.run_batch
+
+    async def failing_run_batch(session, checkpoint):
+        if checkpoint is not None:
+            raise RuntimeError("boom")
+        return await run_batch(session, checkpoint)
+
+    monkeypatch.setattr(migration, "batch_size", 1)
+    monkeypatch.setattr(migration, "run_batch", failing_run_batch)
+    monkeypatch.setattr(migration, "pending", True)
+    monkeypatch.setattr(migrate, "_online_migrating", True)
+    await set_metainfo("online_migrations", [migration.name])
+
+    await migrate._run_online_migrations([migration.name])
+    assert not is_migrating()
+    assert migration.pending and migration.checkpoint == 1
+
+    # 迁移失败后的新对局只计入已迁移的群组，未迁移的群组仍从对局记录中统计
+    async with AsyncSession(engine) as session:
+        repo = UserGameStatsRepository(session)
+        for group_id in (1, 2):
+            game = completed_game(group_id)
+            session.add(game)
+            await session.flush()
+            await repo.add_game(game)
+        await session.commit()
+
+        assert (await repo.get(1, 1)).total == 2
+        assert await repo.get(2, 1) is None
+        assert (await repo.aggregate(2, 1)).total == 2
+
+    # 全量重建后迁移即已完成，之后的对局计入所有群组
+    async with AsyncSession(engine) as session:
+        await UserGameStatsRepository(session).rebuild()
+        await session.commit()
+    assert not migration.pending
+    assert await get_metainfo("online_migrations") is None
+
+    async with AsyncSession(engine) as session:
+        repo = UserGameStatsRepository(session)
+        game = completed_game(2)
+        session.add(game)
+        await session.flush()
+        await repo.add_game(game)
+        await session.commit()
+
+        assert (await repo.get(2, 1)).total == 3
+
+    await engine.dispose()